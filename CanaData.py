@@ -2,21 +2,270 @@
 from datetime import datetime
 from os import path as ospath
 from os import makedirs
+from os import listdir
+from os import remove
+from os import replace
+from os import stat
+from threading import Lock
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from uuid import uuid4
 from sys import path
 from sys import argv
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from collections import deque
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 import requests
+import hashlib
 import json
+import gzip
+import time
+import random
 import csv
+import sqlite3
+import math
+
+from CanaMetrics import CanaMetrics
+
+# pyarrow is only needed for Parquet exports (-parquet)
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+# orjson reads & writes JSON several times faster than json, we use it when it's installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Stand-in for a requests response when the body comes out of our cache
+class CachedResponse:
+
+    def __init__(self, content):
+        # Only successful responses are ever cached
+        self.status_code = 200
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+# On-disk cache of response bodies keyed by URL (gzipped, expires after ttl seconds, oldest thrown out past max_bytes)
+class CanaCache:
+
+    def __init__(self, folder, ttl, max_bytes):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Number of requests answered from the cache
+        self.hits = 0
+        # Cache files we know about (filename -> [size, modified time]) & their total size
+        self.files = {}
+        self.total_bytes = 0
+        # Worker threads share the cache, so changes to our bookkeeping happen one at a time
+        self.lock = Lock()
+
+        # Take stock of what is already in the cache (the folder is only made once there is a response to save)
+        if ospath.exists(folder):
+            for filename in listdir(folder):
+                if filename.endswith('.gz'):
+                    info = stat(f'{folder}/{filename}')
+                    self.files[filename] = [info.st_size, info.st_mtime]
+                    self.total_bytes += info.st_size
+
+    # Each URL gets its own file named after its hash
+    def filename(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest() + '.gz'
+
+    # Returns a CachedResponse for the URL if we have one that hasn't expired, otherwise None
+    def get(self, url):
+        filename = self.filename(url)
+        with self.lock:
+            info = self.files.get(filename)
+        if info is None or time.time() - info[1] > self.ttl:
+            return None
+
+        try:
+            with gzip.open(f'{self.folder}/{filename}', 'rb') as infile:
+                content = infile.read()
+        except (OSError, EOFError):
+            # Gone (another process cleaned it up) or unreadable, either way go to the network
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return CachedResponse(content)
+
+    # Saves the response body for the URL & throws out the oldest files if we are over our size limit
+    def put(self, url, content):
+        filename = self.filename(url)
+        file_path = f'{self.folder}/{filename}'
+
+        makedirs(self.folder, exist_ok=True)
+        # Write to a temporary file first so no one ever reads half a cache file
+        # (named at random, threads & -procs workers saving the same URL never share one)
+        temp_path = f'{file_path}.{uuid4().hex}.tmp'
+        with gzip.open(temp_path, 'wb') as outfile:
+            outfile.write(content)
+        replace(temp_path, file_path)
+        info = stat(file_path)
+
+        with self.lock:
+            if filename in self.files:
+                self.total_bytes -= self.files[filename][0]
+            self.files[filename] = [info.st_size, info.st_mtime]
+            self.total_bytes += info.st_size
+
+            # Over the limit? Throw out the oldest files until we fit
+            if self.total_bytes > self.max_bytes:
+                for old_filename in sorted(self.files, key=lambda name: self.files[name][1]):
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    self.total_bytes -= self.files.pop(old_filename)[0]
+                    try:
+                        remove(f'{self.folder}/{old_filename}')
+                    except OSError:
+                        pass
+
+
+# Decides whether a failed request gets tried again & how long to wait first
+# Swap CanaData.retryPolicy for anything with the same shouldRetry/delay functions to change the behavior
+class RetryPolicy:
+
+    # Statuses worth trying again (rate limits + server hiccups)
+    retryStatuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0, jitter=0.5, max_retry_after=300.0):
+        # Most times we'll make the same request (including the first try)
+        self.max_attempts = max_attempts
+        # Wait after the first failure, doubled every failure after that (up to max_delay)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Fraction of the wait that is randomized so our workers don't all come back at once
+        self.jitter = jitter
+        # Longest we'll honor a Retry-After header for
+        self.max_retry_after = max_retry_after
+
+    # Returns True if the request (attempt # so far, response or error) should be tried again
+    def shouldRetry(self, attempt, response=None, error=None):
+        if attempt >= self.max_attempts:
+            return False
+        if error is not None:
+            return True
+        return response.status_code in self.retryStatuses
+
+    # Returns the seconds to wait before the next attempt
+    def delay(self, attempt, response=None):
+        # Weedmaps tells us how long to back off on rate limits & outages, so listen to them
+        if response is not None and response.status_code in (429, 503):
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    seconds = float(retry_after)
+                except ValueError:
+                    try:
+                        seconds = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    except (TypeError, ValueError):
+                        seconds = None
+                if seconds is not None:
+                    return min(max(seconds, 0), self.max_retry_after)
+
+        # Exponential backoff with jitter
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return backoff * random.uniform(1 - self.jitter, 1)
+
+
+# Raised when a host has failed too many times in a row and we are holding off on it
+class CircuitOpenError(Exception):
+    pass
+
+
+# Keeps track of failures per host & stops sending requests to a host that keeps failing until it cools down
+class CircuitBreaker:
+
+    def __init__(self, threshold=10, cooldown=30.0):
+        # Failures in a row before we stop sending requests to the host
+        self.threshold = threshold
+        # Seconds we hold off before letting requests through again
+        self.cooldown = cooldown
+        # Failures in a row per host & when each host's circuit was opened
+        self.failures = {}
+        self.openedAt = {}
+        # Worker threads share the breaker
+        self.lock = Lock()
+
+    # Returns the seconds left before requests to the host are allowed (0 = go ahead)
+    def waitTime(self, host):
+        with self.lock:
+            if host not in self.openedAt:
+                return 0
+            return max(self.openedAt[host] + self.cooldown - time.time(), 0)
+
+    # Returns True if a request to the host is allowed right now
+    def allow(self, host):
+        return self.waitTime(host) == 0
+
+    # The host answered, so it's healthy again
+    def success(self, host):
+        with self.lock:
+            self.failures.pop(host, None)
+            self.openedAt.pop(host, None)
+
+    # The host failed, open the circuit if it has failed too many times in a row
+    def failure(self, host):
+        with self.lock:
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if self.failures[host] >= self.threshold:
+                if host not in self.openedAt:
+                    print(f'{host} failed {str(self.failures[host])} times in a row, holding off for {str(self.cooldown)} seconds')
+                self.openedAt[host] = time.time()
+
+
+# Raised by flatten_value when an item has a shape it can't flatten exactly like flatten_dictionary does
+class UnknownShape(Exception):
+    pass
 
 
 # Low and behold, the almighty CanaData
 class CanaData:
-    
+
+    # Keys that only say where an item was found or that each listing's menu gives out itself (left out when checking if two items are the same)
+    # Along with every key starting with listingPrefixes, so a chain's storefront & delivery copies of an item still match
+    listingKeys = ('locations_found_at', 'id', 'slug', 'created_at', 'updated_at')
+    listingPrefixes = ('listing_', 'listing.')
+    # Parts of a menu response we use (everything else is dropped as soon as it's decoded)
+    menuKeys = ('listing', 'categories')
+
+    # Weights Weedmaps prices items by (each one is a prices.<weight> column)
+    priceWeights = ('half_gram', 'gram', 'two_grams', 'eighth', 'quarter', 'half_ounce', 'ounce')
+    # Columns the category & brand of an item might be in (first one found is used)
+    categoryKeys = ('category.name', 'category', 'edge_category.name')
+    brandKeys = ('brand.name', 'brand_endorsement.brand_name', 'brand')
+
+    # Settings handed over to each worker process when running slugs in parallel
+    settingNames = ['storefronts', 'deliveries', 'testMode', 'slugGrab', 'menuWorkers', 'locationWorkers', 'boundingBox', 'tiles', 'tileLimit', 'nearMiles', 'poolConnections', 'poolSize', 'timeout', 'resume', 'useCache', 'refreshCache', 'cacheTtl', 'cacheSize', 'retryPolicy', 'streamExport', 'dedupItems', 'parquetExport', 'sqlitePath', 'deltaExport', 'baseUrl', 'menuBaseUrl', 'recordFolder', 'dataFolder', 'quiet', 'promFolder']
+
     def __init__(self):
         # Where the Magic happens
 
         self.baseUrl = 'https://api-g.weedmaps.com/discovery/v1/listings'
         #self.baseUrl = 'https://api-g.weedmaps.com/wm/v1/listings'
+        # Where menus are pulled from (<menuBaseUrl>/<listing slug>/menu)
+        self.menuBaseUrl = 'https://weedmaps.com/api/web/v1/listings'
+        # Folder every listings page & menu response gets saved into as it comes in (None = don't record), CanaServer.py can serve them back
+        self.recordFolder = None
+        # Folder the CanaData_<date> folders & the .canacache go in (next to the script that was run by default)
+        self.dataFolder = path[0]
         # Pagination & Page size
         self.pageSize = '&page_size=100&size=100'
         # Populated with the City/State Slug
@@ -49,103 +298,483 @@ class CanaData:
         self.NonGreenState = False
         # Sets whether or not we grab the slugs for the search
         self.slugGrab = False
+        # Number of menus pulled at the same time (1 = one at a time)
+        self.menuWorkers = 1
+        # Most pages of listings (or map tiles) pulled at the same time once we know how many there are
+        self.locationWorkers = 4
+        # Area to find locations in instead of paging through the whole slug (south, west, north, east), None = the whole slug
+        self.boundingBox = None
+        # The area is split into tiles x tiles pieces, pieces with more than tileLimit locations get split again (up to tileDepth times)
+        self.tiles = 4
+        self.tileLimit = 500
+        self.tileDepth = 3
+        # Miles around a lat/long point we look for locations in
+        self.nearMiles = 10
+        # Number of slugs worked on at the same time, each in its own process (1 = one at a time)
+        self.slugProcesses = 1
+        # Set to True to pick up where the last run left off using the slug's journal
+        self.resume = False
+        # Open journal file for the current slug (every location page & menu gets written as we go) & where it is
+        self.journal = None
+        self.journalFile = None
+        # Set to True when a page of locations or a menu couldn't be pulled (the journal is kept so -resume can try them again)
+        self.journalGaps = False
+        # Menus found in the journal when resuming (listing slug -> menu data)
+        self.journaledMenus = {}
+        # Set to True to flatten & write menu items out as each menu comes in instead of holding them all in memory
+        self.streamExport = False
+        # Spool file holding the flattened items while streaming & every column seen so far (in order)
+        self.streamFile = None
+        self.streamKeys = {}
+        self.streamCount = 0
+        # Set to True to write a Parquet file next to each CSV
+        self.parquetExport = False
+        # Timings & counts for the slug we're working on (saved as <slug>_metrics.json)
+        self.metrics = CanaMetrics('canadata')
+        # Folder a Prometheus textfile (canadata_<slug>.prom) gets written to after each slug (None = don't write one)
+        self.promFolder = None
+        # Set to True to skip the per-listing progress prints
+        self.quiet = False
+        # Set to True to write what changed since the last run (<slug>_delta.csv)
+        self.deltaExport = False
+        # Path to a SQLite database that every slug's listings, items & prices get saved into (None = no database)
+        self.sqlitePath = None
+        # Rows read back & written to a Parquet file/SQLite database at a time
+        self.chunkRows = 50000
+        # Set to True to merge identical items from different listings into one row (with every location it was found at)
+        self.dedupItems = False
+        # Hash of every item kept so far -> (row number, locations it was found at)
+        self.itemHashes = {}
+        # Row number -> every location a kept item was found at (only for items that had duplicates)
+        self.mergedLocations = {}
+        # Number of duplicate items dropped
+        self.duplicatesDropped = 0
+        # Compiled flatteners for every menu item shape we've seen ((keys, value types) -> flattener, or how many times it was seen until it's compiled)
+        self.flatSchemas = {}
+        # Times every set of keys we've seen showed up (a shape is only looked at once its keys show up flatCompileAfter times)
+        self.flatKeys = {}
+        # Times a shape has to show up before it gets compiled (compiling costs about as much as flattening ~100 items the slow way)
+        self.flatCompileAfter = 100
         self.headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'}
+        # Number of hosts we keep connection pools for & connections kept open per host
+        self.poolConnections = 4
+        self.poolSize = 10
+        # Seconds to wait on a request before giving up on it
+        self.timeout = 30
+        # Shared HTTP session so we keep our connections alive between requests
+        self.session = None
+        # Requests & new connections already reported (so each slug reports its own numbers)
+        self.reportedRequests = 0
+        self.reportedConnections = 0
+        self.buildSession()
+        # Set to False to skip the response cache completely
+        self.useCache = True
+        # Set to True to skip reading from the cache (but still save fresh responses to it)
+        self.refreshCache = False
+        # Seconds a cached response is good for & max size of the cache folder in megabytes
+        self.cacheTtl = 3600
+        self.cacheSize = 500
+        # Response cache (built by buildCache) & cache hits already reported
+        self.cache = None
+        self.reportedHits = 0
+        self.buildCache()
+        # Decides when failed requests get tried again (backoff + Retry-After)
+        self.retryPolicy = RetryPolicy()
+        # Stops hammering a host that keeps failing
+        self.breaker = CircuitBreaker()
+
+    # Builds the shared HTTP session every request goes through (pooled connections + keep-alive + compression)
+    def buildSession(self):
+        # Close the old session if we are rebuilding with new settings
+        if self.session is not None:
+            self.session.close()
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # Ask for compressed responses (includes brotli when it is installed and can be decoded)
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        self.session.headers['Connection'] = 'keep-alive'
+
+        # Always keep at least one connection open per menu/location worker
+        adapter = HTTPAdapter(pool_connections=self.poolConnections, pool_maxsize=max(self.poolSize, self.menuWorkers, self.locationWorkers))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Fresh session means fresh connection counts
+        self.reportedRequests = 0
+        self.reportedConnections = 0
+
+    # Builds the on-disk response cache (.canacache in our data folder) if we are using one
+    def buildCache(self):
+        self.reportedHits = 0
+        if self.useCache is False:
+            self.cache = None
+            return
+        self.cache = CanaCache(f'{self.dataFolder}/.canacache', self.cacheTtl, self.cacheSize * 1024 * 1024)
+
+    # Makes a GET request to the URL through our cache & shared session, trying again as our retry policy allows
+    # Returns either a requests response or a CachedResponse (both have status_code, text & json())
+    # If the host's circuit is open we raise CircuitOpenError, unless wait is True then we wait it out
+    # When recording, record is where the response gets saved in the record folder
+    def fetch(self, url, wait=False, record=None):
+        # Answer from the cache if we have a fresh copy
+        if self.cache is not None and self.refreshCache is False:
+            cached = self.cache.get(url)
+            if cached is not None:
+                self.metrics.cacheHit()
+                self.recordResponse(record, cached)
+                return cached
+
+        host = urlparse(url).netloc
+        attempt = 0
+
+        while True:
+            attempt += 1
+
+            # Hold off on hosts that keep failing
+            if not self.breaker.allow(host):
+                if wait is False:
+                    raise CircuitOpenError(f'Holding off on {host} after too many failures')
+                time.sleep(self.breaker.waitTime(host))
+
+            requestStart = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.metrics.request(time.perf_counter() - requestStart, failed=True)
+                # Connection troubles count against the host
+                self.breaker.failure(host)
+                if not self.retryPolicy.shouldRetry(attempt, error=e):
+                    raise
+                time.sleep(self.retryPolicy.delay(attempt))
+                continue
+            self.metrics.request(time.perf_counter() - requestStart, self.wireBytes(response), response.status_code >= 400)
+
+            if response.status_code in RetryPolicy.retryStatuses:
+                self.breaker.failure(host)
+                if self.retryPolicy.shouldRetry(attempt, response=response):
+                    time.sleep(self.retryPolicy.delay(attempt, response))
+                    continue
+                # Out of attempts, hand back the failed response
+                return response
+
+            # The host answered (even a 404 means it's up)
+            self.breaker.success(host)
+            break
+
+        # Save successful responses for next time
+        if self.cache is not None and response.status_code == 200:
+            self.cache.put(url, response.content)
+        self.recordResponse(record, response)
+
+        return response
+
+    # Saves a successful response body (exactly as it came in) to the record folder
+    def recordResponse(self, record, response):
+        if self.recordFolder is None or record is None or response.status_code != 200:
+            return
+
+        record_file = f'{self.recordFolder}/{record}'
+        makedirs(ospath.dirname(record_file), exist_ok=True)
+        with open(record_file, 'wb') as outfile:
+            outfile.write(response.content)
+
+    # Prints how many requests we made since the last report and how many of them reused an open connection
+    def reportConnections(self):
+        requestCount = 0
+        connectionCount = 0
+
+        # Add up the counts from every host's connection pool
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                requestCount += pool.num_requests
+                connectionCount += pool.num_connections
+
+        requestCount -= self.reportedRequests
+        connectionCount -= self.reportedConnections
+        self.reportedRequests += requestCount
+        self.reportedConnections += connectionCount
+
+        reused = max(requestCount - connectionCount, 0)
+        print(f'- {str(requestCount)} Requests over {str(connectionCount)} New Connections ({str(reused)} reused)')
+
+        # Requests we didn't even have to make
+        if self.cache is not None:
+            hits = self.cache.hits - self.reportedHits
+            self.reportedHits += hits
+            print(f'- {str(hits)} Responses from the Cache')
 
     # This function recieves a URL (string) and makes an HTTP request to it
     # If successul, converts the response to JSON and returns the dataset
-    def do_request(self, url):
-        # Make the request to the URL (no authentication)
-        
-        req = requests.get(url, headers=self.headers)
+    def do_request(self, url, record=None):
+        # Make the request to the URL (no authentication), waiting out the circuit breaker since we need every page
+        try:
+            req = self.fetch(url, wait=True, record=record)
+        except requests.RequestException as e:
+            # Print the error into the terminal
+            print(f'Error: {str(e)}')
+            # Return False to signal issues
+            return False
+
         # If status was success
         if req.status_code == 200:
             # Convert dataset to JSON
-            reqJson = req.json()
+            reqJson = self.loadJson(req.content)
             # Return JSON dataset
             return reqJson
         elif req.status_code == 422:
             print(req.text)
-            exit()
             return 'break'
         else:
             # Print the error into the terminal
             print(req.text)
-            exit()
             # Return False to signal issues
             return False
 
     # This function takes no input but uses the self variables to make its requests
     # Looping through to get all Locations for a given City/State slug
-    def getLocations(self, lat=None, long=None):
-        # While true lets us loop until we have all data
-        while True:
-            # Create the url with Offset so to paginate to next set of data
-            url = f'{self.baseUrl}?offset={str(self.locationsFound)}{self.pageSize}'
+    # journal=False skips the journal (nothing is written out, so there is nothing to resume from either)
+    def getLocations(self, lat=None, long=None, journal=True):
+        # Open up the journal for this slug (and load what we already have if we are resuming)
+        if journal is True:
+            self.startJournal()
+
+        # If the journal already had every location we can move right along to the menus
+        if self.maxLocations is not None and self.locationsFound >= self.maxLocations:
+            print(f'\nAll {str(self.locationsFound)} locations were in the journal! Moving to pull Menus\n')
+            return
 
-            # If we are returning storefronts our URL needs extra parameters
-            if self.storefronts is True:
-                url += f'&filter[any_retailer_services][]=storefront&filter[region_slug[dispensaries]]={self.searchSlug}'
+        # Given a point (or an area) we search the map around it tile by tile instead of paging through the whole slug
+        box = self.nearBox(lat, long) if lat is not None and long is not None else self.boundingBox
+        if box is not None:
+            self.getTiledLocations(box)
+            return
 
-            # If we are returning deliveries our URL needs extra parameters
-            if self.deliveries is True:
-                url += f'&filter[any_retailer_services][]=delivery&filter[region_slug[deliveries]]={self.searchSlug}'
+        # Slugs we already have (a listing can land on two pages if the list shifts while we page through it)
+        seenSlugs = set(location['slug'] for location in self.locations)
 
-            # Make the http request and get back either data or False
-            locations = self.do_request(url)
+        # The first page tells us how many locations there are & how many Weedmaps sends back per page
+        # Make the http request and get back either data or False
+        locations = self.fetchLocations(self.locationsFound)
 
-            # Check if the request was successul or not
-            if locations is not False:
+        # If there is an issue pulling the first page after all our retries (potentially due to rate limiting)
+        if locations is False or locations == 'break':
+            self.locationsDone(locations is False)
+            return
+
+        # If we haven't set our max # of locations, do so (the journal already did if we are resuming)
+        if self.maxLocations is None:
+            # Set self variable to the responses' total listing attribute
+            self.maxLocations = locations['meta']['total_listings']
+            # Print what we set the max at for visual checking
+            print(f'\nSet the max locations # to {self.maxLocations}')
+
+            # If the Max locations is 0, then we know we should stop going forward
+            if self.maxLocations == 0:
+                # Print that we found nothing
+                print('Found no locations for the state (sad times)!')
+                # Add the state to our list of un-green states
+                self.unFriendlyStates.append(self.searchSlug)
+                # Set our non green state attribute to True so it knows to stop processing this slug
+                self.NonGreenState = True
+                return
+
+        # Pages are as long as the first one (an empty first page would never get us anywhere, so go with 100)
+        pageLength = len(locations['data']['listings']) or 100
+        self.takeLocations(locations, self.locationsFound, seenSlugs)
+
+        # Every page that's left starts at a known offset, so they're all pulled at the same time
+        # Pages are taken in offset order, the journal only gets pages up until the first one that failed (so -resume starts from there)
+        offsets = list(range(self.locationsFound, self.maxLocations, pageLength))
+        failedOffset = None
+        with ThreadPoolExecutor(max_workers=self.locationWorkers) as executor:
+            pending = [executor.submit(self.fetchLocations, offset) for offset in offsets]
+
+            for offset, future in zip(offsets, pending):
+                locations = future.result()
+
+                # Asking past the end means the list got shorter since the first page, we have everything
                 if locations == 'break':
                     break
-                # If we haven't set our max # of locations, do so
-                if self.maxLocations is None:
-                    # Set self variable to the responses' total listing attribute
-                    self.maxLocations = locations['meta']['total_listings']
-                    # Print what we set the max at for visual checking
-                    print(f'\nSet the max locations # to {self.maxLocations}')
-
-                    # If the Max locations is 0, then we know we should stop going forward
-                    if locations['meta']['total_listings'] == 0:
-                        # Print that we found nothing
-                        print('Found no locations for the state (sad times)!')
-                        # Add the state to our list of un-green states
-                        self.unFriendlyStates.append(self.searchSlug)
-                        # Set our non green state attribute to True so it knows to stop processing this slug
-                        self.NonGreenState = True
-                        # Break out of the While true loop
+                # Keep going with the pages after a failed one, they just don't go in the journal
+                if locations is False:
+                    if failedOffset is None:
+                        failedOffset = offset
+                    continue
+
+                # A page that came back short (pages shifted or Weedmaps changed the size) leaves a gap, fill it in one page at a time
+                while failedOffset is None and self.locationsFound < offset:
+                    gap = self.fetchLocations(self.locationsFound)
+                    if gap is False or gap == 'break' or len(gap['data']['listings']) == 0:
+                        failedOffset = self.locationsFound
                         break
+                    self.takeLocations(gap, self.locationsFound, seenSlugs)
+
+                self.takeLocations(locations, offset, seenSlugs, journal=failedOffset is None)
+
+        self.locationsDone(failedOffset is not None)
+
+    # Finds every location inside box (south, west, north, east) by splitting it into tiles & pulling the tiles at the same time
+    def getTiledLocations(self, box):
+        tiles = self.splitBox(box, self.tiles)
+        print(f'\nSearching {str(len(tiles))} tiles of {self.boxText(box)} for locations')
+
+        with ThreadPoolExecutor(max_workers=self.locationWorkers) as executor:
+            results = list(executor.map(self.fetchTile, tiles))
+
+        # Put the tiles together in order, a listing on the edge of two tiles is only kept once
+        seenSlugs = set(location['slug'] for location in self.locations)
+        failed = False
+        for listings, tileFailed in results:
+            failed = failed or tileFailed
+            for location in listings:
+                if location['slug'] not in seenSlugs:
+                    seenSlugs.add(location['slug'])
+                    self.locations.append(location)
+
+        self.locationsFound = len(self.locations)
+        self.maxLocations = self.locationsFound
+        print(f'\nFound {str(self.locationsFound)} locations in the tiles')
+
+        # An empty area just means there's nothing around there
+        if self.locationsFound == 0 and failed is False:
+            print('Found no locations in the area (sad times)!')
+            self.NonGreenState = True
+            return
 
-                # Visual queue to how far along the script is
-                print(f'Working on locations #{self.locationsFound} through #{self.locationsFound+len(locations["data"]["listings"])}')
+        # Tiles have no offsets, so the journal gets every location at once (only if every tile came in, otherwise -resume searches them again)
+        if failed is False:
+            self.writeJournal({'offset': self.locationsFound, 'max': self.maxLocations, 'locations': self.locations})
 
-                # Loop through the listings and pull out the slug and type
-                for location in locations['data']['listings']:
-                    location_dct = {}
-                    location_dct['slug'] = location['slug']
-                    location_dct['type'] = location['type']
-                    self.locations.append(location_dct)
+        self.locationsDone(failed)
 
-                    # Count the number of listings
-                    self.locationsFound += 1
+    # Pulls every location in a tile (runs inside the worker threads of getTiledLocations so it should only fetch)
+    # Tiles with more than tileLimit locations get split into 4 instead of paging deep into them
+    # Returns (list of locations (slug + type), True if a page failed)
+    def fetchTile(self, box, depth=0):
+        locations = []
+        offset = 0
 
-                # IF we've reached the max number of locations, we are finished so break
-                if self.locationsFound == self.maxLocations:
-                    print('\nRetrieved all locations! Moving to pull Menus\n')
-                    break
+        while True:
+            page = self.do_request(self.locationsUrl(offset, box), record=f'{self.searchSlug}/tiles/{self.boxText(box)}_{str(offset)}.json')
+            # Asking past the end means we have everything
+            if page == 'break':
+                return locations, False
+            if page is False:
+                return locations, True
+
+            total = page['meta']['total_listings']
+            if offset == 0 and total > self.tileLimit and depth < self.tileDepth:
+                found = []
+                failed = False
+                for tile in self.splitBox(box, 2):
+                    tileLocations, tileFailed = self.fetchTile(tile, depth + 1)
+                    found.extend(tileLocations)
+                    failed = failed or tileFailed
+                return found, failed
+
+            for location in page['data']['listings']:
+                locations.append({'slug': location['slug'], 'type': location['type']})
+            offset += len(page['data']['listings'])
+            self.progress(f'Tile {self.boxText(box)}: {str(offset)}/{str(total)} locations')
+
+            if offset >= total or len(page['data']['listings']) == 0:
+                return locations, False
+
+    # Splits box (south, west, north, east) into pieces x pieces tiles (west to east, then south to north)
+    def splitBox(self, box, pieces):
+        south, west, north, east = box
+        height = (north - south) / pieces
+        width = (east - west) / pieces
+        return [(south + row * height, west + column * width, south + (row + 1) * height, west + (column + 1) * width) for row in range(pieces) for column in range(pieces)]
+
+    # Box (south, west, north, east) nearMiles around a point
+    def nearBox(self, lat, long):
+        latMiles = self.nearMiles / 69.0
+        # A degree of longitude gets shorter the further from the equator we are
+        longMiles = self.nearMiles / (69.0 * max(math.cos(math.radians(lat)), 0.01))
+        return (lat - latMiles, long - longMiles, lat + latMiles, long + longMiles)
+
+    # Box as south,west,north,east (what Weedmaps' bounding box filter takes)
+    def boxText(self, box):
+        return ','.join(str(round(value, 5)) for value in box)
+
+    # Builds the listings URL for the page starting at offset (only listings inside box if we are given one)
+    def locationsUrl(self, offset, box=None):
+        # Create the url with Offset so to paginate to next set of data
+        url = f'{self.baseUrl}?offset={str(offset)}{self.pageSize}'
+
+        # If we are searching an area our URL needs its bounding box
+        if box is not None:
+            url += f'&filter[bounding_box]={self.boxText(box)}'
+
+        # If we are returning storefronts our URL needs extra parameters
+        if self.storefronts is True:
+            url += f'&filter[any_retailer_services][]=storefront&filter[region_slug[dispensaries]]={self.searchSlug}'
+
+        # If we are returning deliveries our URL needs extra parameters
+        if self.deliveries is True:
+            url += f'&filter[any_retailer_services][]=delivery&filter[region_slug[deliveries]]={self.searchSlug}'
+
+        return url
+
+    # Pulls the page of listings starting at offset (runs inside the worker threads of getLocations so it should only fetch)
+    # Returns the JSON dataset, 'break' if we asked past the end or False if there was an issue
+    def fetchLocations(self, offset):
+        return self.do_request(self.locationsUrl(offset), record=f'{self.searchSlug}/listings_{str(offset)}.json')
+
+    # Adds the page of listings starting at offset to our locations dataset (skipping slugs we already have) & saves it to the journal
+    def takeLocations(self, locations, offset, seenSlugs, journal=True):
+        # Visual queue to how far along the script is
+        self.progress(f'Working on locations #{offset} through #{offset+len(locations["data"]["listings"])}')
+
+        # Where this page's listings start in our locations dataset
+        pageStart = len(self.locations)
+
+        # Loop through the listings and pull out the slug and type
+        for location in locations['data']['listings']:
+            if location['slug'] in seenSlugs:
+                continue
+            seenSlugs.add(location['slug'])
+
+            location_dct = {}
+            location_dct['slug'] = location['slug']
+            location_dct['type'] = location['type']
+            self.locations.append(location_dct)
+
+        # Count the number of listings (the next page starts after this one, a gap page can end past a page we already have)
+        self.locationsFound = max(self.locationsFound, offset + len(locations['data']['listings']))
+
+        # Save the page to our journal so a resumed run can start from the next offset
+        if journal is True:
+            self.writeJournal({'offset': self.locationsFound, 'max': self.maxLocations, 'locations': self.locations[pageStart:]})
+
+    # Wraps up getLocations, failed is True if there was a page we couldn't get
+    def locationsDone(self, failed):
+        if failed is True:
+            self.journalGaps = True
+        # No locations at all means there is nothing to work with
+        if len(self.locations) == 0:
+            print('Issue with Page, giving up on this slug!')
+            # Set NonGreenState to True to skip other functions when we get to them
+            self.NonGreenState = True
+        # Otherwise pull the menus for what we have (the journal lets -resume pick up the rest later)
+        elif failed is True:
+            print(f'Issue with Page, moving on with the {str(len(self.locations))} locations we have! (-resume will try the rest)')
+        else:
+            print('\nRetrieved all locations! Moving to pull Menus\n')
 
-            # If there is an issue pulling the data from the page, (potentially due to rate limiting), ask user to continue or not
-            else:
-                # User is prompted to enter no/n or hit enter to continue
-                retry = input('Issue with Page. Retry? (n/no or hit enter)\n\n- ').lower()
+    # Craft a URL which pulls all menu items for a location
+    def menuUrl(self, location):
+        return f'{self.menuBaseUrl}/{location["slug"]}/menu?type={location["type"]}'
 
-                # If the user put "n" or "no" then we stop trying and put this slug into the list of bad states
-                if 'n' in retry or 'no' in retry:
-                    # Set NonGreenState to True to skip other functions when we get to them
-                    self.NonGreenState = True
-                    break
-                # Otherwise we try again!
-                else:
-                    self.do_request(url)
+    # This function recieves a location (slug + type) and makes the HTTP request for its menu
+    # Runs inside the worker threads of getMenus so it should only fetch, not touch our datasets
+    def fetchMenu(self, location, wait=False):
+        # Get the menu data from the URL
+        return self.fetch(self.menuUrl(location), wait=wait, record=f'menus/{location["slug"]}.json')
 
     # This function goes through the list of locations and gets the menu + flattens the items
     def getMenus(self):
@@ -154,126 +783,288 @@ class CanaData:
             return
 
         location_count = 0
+        menusStart = time.perf_counter()
+
+        # Add every menu to our datasets as it comes in
+        for menuJsonData in self.iterMenus():
+            try:
+                self.processMenu(menuJsonData)
+            except Exception as e:
+                print('Caught an error on the Try function:\n')
+                print(e)
+                print('Ok, skipping that locations items!')
+                continue
+            location_count += 1
+
+        # Every menu is in, close up the journal (it's thrown out if nothing is left for -resume to pick up)
+        self.closeJournal(finished=True)
+        self.metrics.addPhase('menus', time.perf_counter() - menusStart, location_count)
+
+        # Streamed items were flattened as they came in, nothing left to organize
+        if self.streamExport is True:
+            print('\n\nFinished grabbing all the Menus & Items! (already flattened while streaming)\n')
+            return
 
-        seen_locations = []
+        print('\n\nFinished grabbing all the Menus & Items! \n\nOrganizing now into clean lists for export!\n(up to a couple minutes on those big exports (5k+) looking at you California)\n')
+        # Special function to flatten all our Menu items!
+        self.organize_into_clean_list()
 
-        # If the city/state slug is friendly, then loop through the listings one by one
-        for location in self.locations:
-            finished = False
+    # Yields the menu (JSON) of every location in listing order, pulling them with our pool of workers
+    # A menu is saved to the journal once whoever is looping over us asks for the next one (so it's in their datasets first)
+    def iterMenus(self):
+        location_count = 0
 
-            while finished is False:
-                try:
-                    # Craft a URL variable which pulls all menu items for a location
-                    url = f'https://weedmaps.com/api/web/v1/listings/{location["slug"]}/menu?type={location["type"]}'
+        # Locations whose menu failed, we give them another go once everything else is done
+        retryQueue = []
+
+        # Pool of workers pulling menus ahead of us (1 worker is the same as one at a time)
+        with ThreadPoolExecutor(max_workers=self.menuWorkers) as executor:
+            # Menus being pulled ahead of us as (location, future), in the same order as our locations (ones already in the journal get no future)
+            # Only a couple per worker are kept going so memory doesn't grow with the number of locations, a finished one is dropped as soon as we read it
+            upcoming = iter(self.locations)
+            pending = deque()
+
+            # Tops the read ahead back up with the next locations
+            def readAhead():
+                while len(pending) < self.menuWorkers * 2:
+                    location = next(upcoming, None)
+                    if location is None:
+                        return
+                    pending.append((location, None if location['slug'] in self.journaledMenus else executor.submit(self.fetchMenu, location)))
+
+            try:
+                readAhead()
+                # Loop through the listings one by one (in listing order so our results are always the same)
+                while len(pending) > 0:
+                    location, future = pending.popleft()
+                    readAhead()
+
+                    # Menus we pulled before the last run died come straight out of the journal
+                    if location['slug'] in self.journaledMenus:
+                        location_count += 1
+                        yield self.journaledMenus.pop(location['slug'])
+                        continue
 
                     # Print visual queue the location is being worked on
-                    print(f'\nWorking on menu ({str(location_count)}/{str(len(self.locations))}) --> {location["slug"]}')
+                    self.progress(f'\nWorking on menu ({str(location_count)}/{str(len(self.locations))}) --> {location["slug"]}')
                     if self.testMode is True:
-                        print(f'Using url: {url}\n(for troubleshooting in browser)')
+                        self.progress(f'Using url: {self.menuUrl(location)}\n(for troubleshooting in browser)')
+
+                    try:
+                        # Grab the menu our workers pulled (same location twice in a list only gets one future)
+                        menuData = future.result() if future is not None else self.fetchMenu(location)
+                        # Let go of the future & response, the menu is all we need from here
+                        future = None
+                        menuJsonData = self.readMenu(location, menuData)
+                        menuData = None
+                    except Exception as e:
+                        print('Caught an error on the Try function:\n')
+                        print(e)
+                        menuJsonData = None
+
+                    if menuJsonData is None:
+                        print('Will give that one another go at the end!')
+                        retryQueue.append(location)
+                        continue
+
+                    location_count += 1
+                    # Snapshot the menu as it came in (processMenu adds to it)
+                    journalLine = self.dumpJson({'menu': location['slug'], 'data': menuJsonData})
+                    yield menuJsonData
+                    # Now that it's in our datasets, save it to the journal
+                    self.writeJournal(journalLine)
+            finally:
+                # If we were stopped early, don't wait on menus nobody is going to use
+                for location, future in pending:
+                    if future is not None:
+                        future.cancel()
+
+        # Drain the retry queue, this time waiting out the circuit breaker if Weedmaps needs a breather
+        if len(retryQueue) > 0:
+            print(f'\n\nRetrying {str(len(retryQueue))} menus that had issues')
+        for location in retryQueue:
+            print(f'\nRetrying menu --> {location["slug"]}')
+            try:
+                menuJsonData = self.readMenu(location, self.fetchMenu(location, wait=True))
+            except Exception as e:
+                print('Caught an error on the Try function:\n')
+                print(e)
+                menuJsonData = None
+
+            if menuJsonData is None:
+                print('Ok, skipping that locations items!')
+                self.journalGaps = True
+                continue
+
+            journalLine = self.dumpJson({'menu': location['slug'], 'data': menuJsonData})
+            yield menuJsonData
+            self.writeJournal(journalLine)
+
+    # This function takes the response for a location's menu and gives back its JSON
+    # Returns None if the menu should be tried again later
+    def readMenu(self, location, menuData):
+        if menuData.status_code == 503:
+            print('First Byte error. Unsure of what this means! Please reach out in discord.')
+            return None
+
+        # If that was successful
+        if menuData.status_code == 200:
+            self.progress('Successfully retrieved!')
+            # Convert the menu data to JSON to work with
+            return self.decodeMenu(menuData.content)
+
+        print('Issue with retrieval:\n')
+        print(menuData.text)
+        return None
+
+    # Decodes a menu response, keeping only the parts of it we use (menus come with plenty more we'd just carry around)
+    def decodeMenu(self, content):
+        menu = self.loadJson(content)
+        return {key: menu[key] for key in self.menuKeys if key in menu}
+
+    # Bytes a response took on the wire (before gzip is undone), the body's size if the raw stream can't tell us
+    def wireBytes(self, response):
+        content = response.content
+        try:
+            return int(response.raw.tell())
+        except Exception:
+            return len(content)
+
+    # Reads JSON (str or bytes) with orjson when we have it
+    def loadJson(self, content):
+        if orjson is not None:
+            return orjson.loads(content)
+        return json.loads(content)
+
+    # Writes JSON to a string with orjson when we have it (json takes over for anything orjson won't write, like huge numbers)
+    def dumpJson(self, data):
+        if orjson is not None:
+            try:
+                return orjson.dumps(data).decode('utf-8')
+            except TypeError:
+                pass
+        return json.dumps(data)
+
+    # This function takes a menu (JSON) and adds its listing + items to our datasets
+    # Gives back the menu's items, keepItems=False leaves them out of allMenuItems & the stream (for whoever called us to use)
+    def processMenu(self, menuJsonData, keepItems=True):
+        # Integer to count # of menu items for listing
+        menu_items = 0
+
+        if len(menuJsonData["categories"]) == 0:
+            self.progress('No Categories means no items, moving on!\nGrabbed the listing info though')
+            # Add the listing to our totalLocations list
+            self.totalLocations.append(menuJsonData['listing'])
+            # Dictionary of Empty Location Menus added to the EmptyMenus Dictionary
+            self.emptyMenus[menuJsonData["listing"]["id"]] = menuJsonData["listing"]
+            self.progress(f'Added to Total Locations (empty menu)! {str(len(self.totalLocations))}')
+            return []
+        else:
+            # Print visual of how many Categories exist in this menu
+            self.progress(f'There are {str(len(menuJsonData["categories"]))} Categories in the Menu!')
+
+        # Create a string representation of the Listing (this should be what each item refers to in listing_url)
+        if menuJsonData["listing"]["_type"] == 'delivery':
+            listing_type = 'deliveries'
+        elif menuJsonData["listing"]["_type"] == 'dispensary':
+            listing_type = 'dispensaries'
+        else:
+            print(menuJsonData['listing']['_type'])
 
-                    # Get the menu data from the URL
-                    menuData = requests.get(url, headers=self.headers)
+        listing_url = f'/{listing_type}/{menuJsonData["listing"]["slug"]}'
+        # print(f'-- The listing URL is: {listing_url}')
 
-                    if menuData.status_code == 503:
-                        print('First Byte error. Unsure of what this means but skipping for now! Please reach out in discord.')
-                        finished = True
-                        break
+        # When streaming, a listing we already wrote out (same listing twice in our locations) isn't written again
+        streamItems = keepItems is True and self.streamExport is True and menuJsonData["listing"]["id"] not in self.allMenuItems
 
-                    # If that was successful
-                    if menuData.status_code == 200:
-                        print('Successfully retrieved!')
-                        # Convert the menu data to JSON to work with
-                        menuJsonData = menuData.json()
+        # Every item in this menu (only kept in allMenuItems when we aren't streaming)
+        items = []
+        self.allMenuItems[menuJsonData["listing"]["id"]] = items if keepItems is True and self.streamExport is False else []
 
-                        # Add to our count of Listing Progress
-                        location_count += 1
+        # Loop through each menu category
+        for menuItemCategory in menuJsonData['categories']:
+            for menuItem in menuItemCategory['items']:
+                menuItem['locations_found_at'] = [listing_url]
+                menuItem['listing_id'] = menuJsonData["listing"]["id"]
+                menuItem['listing_wmid'] = menuJsonData["listing"]["wmid"]
+                # Flatten & write the item out right away when streaming (allMenuItems only keeps track of the listing)
+                if streamItems:
+                    self.streamMenuItem(menuItem)
+                # Add the menu item to our list (which is in our allMenuItems dictionary when we aren't streaming)
+                items.append(menuItem)
+                menu_items += 1
+                self.menuItemsFound += 1
 
-                        # Clean dictionary to house the finished encoded items + reorganizes them all into right order
-                        clean_listing = {}
-
-                        # Integer to count # of menu items for listing
-                        menu_items = 0
-
-                        # Loop through values of the Listing Data (not menu items) to clean them with encoding!
-                        for listingKey in menuJsonData['listing'].keys():
-                            clean_listing[listingKey] = str(menuJsonData['listing'][listingKey]).encode('utf-8')
-
-                        if len(menuJsonData["categories"]) == 0:
-                            print('No Categories means no items, moving on!\nGrabbed the listing info though')
-                            # Add the listing to our totalLocations list
-                            self.totalLocations.append(menuJsonData['listing'])
-                            # Dictionary of Empty Location Menus added to the EmptyMenus Dictionary
-                            self.emptyMenus[menuJsonData["listing"]["id"]] = menuJsonData["listing"]
-                            print(f'Added to Total Locations (empty menu)! {str(len(self.totalLocations))}')
-                            finished = True
-                            break
-                        else:
-                            # Print visual of how many Categories exist in this menu
-                            print(f'There are {str(len(menuJsonData["categories"]))} Categories in the Menu!')
-
-                        # Create a string representation of the Listing (this should be what each item refers to in listing_url)
-                        if menuJsonData["listing"]["_type"] == 'delivery':
-                            listing_type = 'deliveries'
-                        elif menuJsonData["listing"]["_type"] == 'dispensary':
-                            listing_type = 'dispensaries'
-                        else:
-                            print(menuJsonData['listing']['_type'])
-
-                        listing_url = f'/{listing_type}/{menuJsonData["listing"]["slug"]}'
-                        # print(f'-- The listing URL is: {listing_url}')
-
-                        self.allMenuItems[menuJsonData["listing"]["id"]] = []
-
-                        # Loop through each menu category
-                        for menuItemCategory in menuJsonData['categories']:
-                            for menuItem in menuItemCategory['items']:
-                                menuItem['locations_found_at'] = [listing_url]
-                                menuItem['listing_id'] = menuJsonData["listing"]["id"]
-                                menuItem['listing_wmid'] = menuJsonData["listing"]["wmid"]
-                                # Add the menu item to our allMenuItems dictionary
-                                self.allMenuItems[menuJsonData["listing"]["id"]].append(menuItem)
-                                menu_items += 1
-                                self.menuItemsFound += 1
-
-                        # Visual progress of Listing's items amount
-                        finished_statement = f'#{str(menu_items)} Items in the Menu!'
-                        if menu_items == 0:
-                            finished_statement += '  <--- Will be on Listings CSV but no items on Menu Results!'
-                        # print(finished_statement)
-
-                        # Add # of menu items to listing Info!
-                        menuJsonData['listing']['num_menu_items'] = str(menu_items)
-
-                        # print(f'#{str(self.menuItemsFound)} Total Items Processed!!')
-
-                        # Add the listing to our totalLocations list
-                        self.totalLocations.append(menuJsonData['listing'])
-                        print(f'Added to Total Locations (normal)! {str(len(self.totalLocations))}')
-
-                        # print(f'#{str(len(self.allMenuItems.keys()))} Total Menus Processed!!')
-
-                        finished = True
+        # Visual progress of Listing's items amount
+        finished_statement = f'#{str(menu_items)} Items in the Menu!'
+        if menu_items == 0:
+            finished_statement += '  <--- Will be on Listings CSV but no items on Menu Results!'
+        # print(finished_statement)
 
-                    else:
-                        print('Issue with retrieval:\n')
-                        print(menuData.text)
-                        skip_check = input('Issue with menu retrival, see issue and hit Enter to retry or enter "Skip" to continue\n\n- ').lower()
-                        if 'skip' in skip_check.lower():
-                            print('Ok, skipping that locations items!')
-                            finished = True
-                        continue
+        # Add # of menu items to listing Info!
+        menuJsonData['listing']['num_menu_items'] = str(menu_items)
 
-                except Exception as e:
-                    print('Caught an error on the Try function:\n')
-                    print(e)
-                    skip_check = input('Issue with menu retrival, see issue and hit Enter to retry or enter "Skip" to continue\n\n- ').lower()
-                    if 'skip' in skip_check.lower():
-                        print('Ok, skipping that locations items!')
-                        finished = True
-                    continue
-        print('\n\nFinished grabbing all the Menus & Items! \n\nOrganizing now into clean lists for export!\n(up to a couple minutes on those big exports (5k+) looking at you California)\n')
-        # Special function to flatten all our Menu items!
-        self.organize_into_clean_list()
+        # print(f'#{str(self.menuItemsFound)} Total Items Processed!!')
+
+        # Add the listing to our totalLocations list
+        self.totalLocations.append(menuJsonData['listing'])
+        self.progress(f'Added to Total Locations (normal)! {str(len(self.totalLocations))}')
+
+        # print(f'#{str(len(self.allMenuItems.keys()))} Total Menus Processed!!')
+
+        return items
+
+    # This function flattens a single menu item & writes it to the spool file (streaming mode)
+    def streamMenuItem(self, menuItem):
+        # Open up the spool for this slug on the first item
+        if self.streamFile is None:
+            self.streamFile = open(f'{self.outputFolder()}/{self.searchSlug}_results.spool.jsonl', 'w', encoding='utf-8')
+
+        flatData = self.flatten_fast(menuItem)
+
+        # Items we already wrote out for another listing only add their location
+        if self.dedupItems is True and self.dedupeItem(flatData, menuItem['locations_found_at'], self.streamCount):
+            return
+
+        # Keep track of every column we've seen in the order we saw them
+        for key in flatData:
+            if key not in self.streamKeys:
+                self.streamKeys[key] = None
+
+        self.streamFile.write(self.dumpJson(flatData) + '\n')
+        self.streamCount += 1
+
+    # Function turns the spool of flattened items into the finished CSV (same columns & order as csv_maker)
+    # Only one item is in memory at a time, the spool is removed once the CSV is written
+    def streamToCSV(self, filename):
+        if self.streamFile is None:
+            raise ValueError('No menu items were streamed')
+
+        spool_file = self.streamFile.name
+        self.streamFile.close()
+        self.streamFile = None
+
+        all_keys = list(self.streamKeys)
+
+        with open(f'{self.outputFolder()}/{filename}.csv', 'w', newline='', encoding='utf-8') as outfile, open(spool_file, encoding='utf-8') as infile:
+            # Setup csv writer with file
+            output = csv.writer(outfile)
+
+            # Write row of keys
+            output.writerow(all_keys)
+
+            # Fill out every item with the columns it's missing as we write it
+            for row_number, line in enumerate(infile):
+                item = self.loadJson(line)
+                # Items that had duplicates get every location they were found at
+                if row_number in self.mergedLocations:
+                    item['locations_found_at'] = str(self.mergedLocations[row_number])
+                output.writerow([str(item[key]) if key in item else 'None' for key in all_keys])
+
+        remove(spool_file)
+
+        # Print visual notification of finished export & number of items seen
+        print(f'Successfully exported ({str(self.streamCount)} items) to CSV -> {filename}.csv')
 
     # This function loops through our identifed menu items and flattens them into exportable datasets
     def organize_into_clean_list(self):
@@ -283,48 +1074,180 @@ class CanaData:
         # This is where our flat datasets will reside once finished
         flatDictList = []
 
-        # Loop through the Listings
-        for listing in listings:
-            # Loop through the menu item Dictionaries for each listings
-            for item in listings[listing]:
-                # Flatten the dataset for each item
-                flatData = self.flatten_dictionary(item)
-                # Add the flat dataset to our flatDictList
-                flatDictList.append(flatData)
-
-        # This list will be all possible keys
-        all_keys = []
+        with self.metrics.phase('flatten', sum(len(listings[listing]) for listing in listings)):
+            # Loop through the Listings
+            for listing in listings:
+                # Loop through the menu item Dictionaries for each listings
+                for item in listings[listing]:
+                    # Flatten the dataset for each item
+                    flatData = self.flatten_fast(item)
+                    # Skip items we already have from another listing (their location gets added to the one we kept)
+                    if self.dedupItems is True and self.dedupeItem(flatData, item['locations_found_at'], len(flatDictList)):
+                        continue
+                    # Add the flat dataset to our flatDictList
+                    flatDictList.append(flatData)
+
+            # Items that had duplicates get every location they were found at
+            for row_number, locations in self.mergedLocations.items():
+                flatDictList[row_number]['locations_found_at'] = str(locations)
+
+        # Replace our finished menu items list with our flat, ordered, dictionary list
+        with self.metrics.phase('key_union', len(flatDictList)):
+            self.finishedMenuItems = self.fill_in_keys(flatDictList)
+
+    # Checks a flat item against every item kept so far, everything but the listing's own keys (where it was found, its id, dates, ...) has to match
+    # A duplicate adds its locations to the kept item (row_number is the row the item would get if kept) & True is returned so it gets dropped
+    def dedupeItem(self, flatData, locations, row_number):
+        itemHash = hashlib.sha1(self.dumpJson([[key, flatData[key]] for key in flatData if key not in self.listingKeys and not key.startswith(self.listingPrefixes)]).encode('utf-8')).digest()
+
+        kept = self.itemHashes.get(itemHash)
+        if kept is None:
+            self.itemHashes[itemHash] = (row_number, locations)
+            return False
+
+        # Start from the locations the kept item had & add any new ones
+        merged = self.mergedLocations.setdefault(kept[0], list(kept[1]))
+        for location in locations:
+            if location not in merged:
+                merged.append(location)
+        self.duplicatesDropped += 1
+        return True
+
+    # This function recieves a list of flat dictionaries & gives back a new list where every dictionary has every key (in the same order)
+    def fill_in_keys(self, flatDictList):
+        # Every key we've seen in the order we first saw them (a dictionary's keys work as an ordered set with instant lookups)
+        all_keys = {}
+
+        # Loop through the flatDictList and grab all the keys (keys we already have keep their spot)
+        for item in flatDictList:
+            all_keys.update(dict.fromkeys(item))
+
+        # Row with every key set to "None", each item gets laid over a copy of it
+        # Keys already in a dictionary keep their spot when updated, so every row comes out in all_keys order
+        # (flatten_dictionary only gives back strings, so the values are ready to go)
+        blank_row = dict.fromkeys(all_keys, 'None')
+
         # This list will house all data after each key has been filled out if it wasn't present before
         ready_list = []
 
-        # Loop through the flatDictList and grab all the keys
-        for item in flatDictList:
-            # for each key in each menu item dictionary
-            for key in item.keys():
-                # If we haven't grabbed the key already
-                if key not in all_keys:
-                    # Add the key to our all_keys list
-                    all_keys.append(key)
-
-        # Loop through the flatDictList to update any missing keys
+        # Loop through the flatDictList to fill in any missing keys
         for item in flatDictList:
-            # New dicitonary the dataset will be put into
-            flat_ordered_dict = {}
-            # List of current keys in the dictionary
-            current_keys = list(item.keys())
-            # Loop through the list of all_keys
-            for all_key in all_keys:
-                # if one of the all_keys is not present in this dicitonary's key list, add it with value
-                if all_key in current_keys:
-                    flat_ordered_dict[all_key] = str(item[all_key])
-                # IF the key is not present in the dictionary's key list, add it with value as "None"
-                else:
-                    flat_ordered_dict[all_key] = 'None'
+            flat_ordered_dict = blank_row.copy()
+            flat_ordered_dict.update(item)
             # Add our ordered dict to the Ready List
             ready_list.append(flat_ordered_dict)
 
-        # Replace our finished menu items list with our flat, ordered, dictionary list
-        self.finishedMenuItems = ready_list
+        return ready_list
+
+    # Flattens a menu item exactly like flatten_dictionary, but much faster
+    # Menu items nearly all share the same shape, so the second time we see a shape we compile a flattener just for it
+    # Shapes we've only seen once (and anything a flattener can't handle exactly like flatten_dictionary) go through flatten_dictionary
+    def flatten_fast(self, d):
+        # A shape only gets compiled once it has shown up often enough to pay for it, until then it's flattened the slow way
+        # Counting the keys alone first is cheap, so items with keys we hardly ever see don't cost much more than the slow way
+        keys = tuple(d)
+        seen = self.flatKeys.get(keys, 0)
+        if seen < self.flatCompileAfter:
+            # Don't let odd shaped data grow our schemas forever
+            if seen > 0 or len(self.flatKeys) < 10000:
+                self.flatKeys[keys] = seen + 1
+            return self.flatten_dictionary(d)
+
+        shape = (keys, tuple(map(type, d.values())))
+        flattener = self.flatSchemas.get(shape, 0)
+        if type(flattener) is int:
+            if flattener + 1 < self.flatCompileAfter:
+                if flattener > 0 or len(self.flatSchemas) < 10000:
+                    self.flatSchemas[shape] = flattener + 1
+                return self.flatten_dictionary(d)
+            flattener = self.flatSchemas[shape] = self.compile_flattener(d)
+
+        result = {}
+        try:
+            flattener(d, result, self.flatten_value)
+        except UnknownShape:
+            return self.flatten_dictionary(d)
+        return result
+
+    # Writes out (and compiles) a function that flattens dictionaries shaped just like d
+    # Every flat key name is baked into the function, nested dictionaries get checked against the shape they had in d
+    def compile_flattener(self, d):
+        lines = ['def flattener(d, result, flatten_value):']
+        constants = {}
+        self.compile_node(d, 'd', '', 1, lines, constants)
+        exec('\n'.join(lines), constants)
+        return constants['flattener']
+
+    # Adds the lines that flatten the dictionary called name (shaped like d) to lines
+    def compile_node(self, d, name, prefix, depth, lines, constants):
+        indent = '    ' * depth
+        names = [f'{name}_{str(i)}' for i in range(len(d))]
+        if len(names) < 1:
+            lines.append(f'{indent}pass')
+            return
+        lines.append(f'{indent}{"".join(n + ", " for n in names)}= {name}.values()')
+
+        for n, (k, v) in zip(names, d.items()):
+            flat_key = repr(prefix + k)
+            if type(v) is str:
+                lines.append(f'{indent}result[{flat_key}] = {n}')
+            elif type(v) is dict and len(v) > 0:
+                # Same shape as last time gets flattened right here, anything else the slow way
+                shape = f'shape_{str(len(constants))}'
+                constants[shape] = (tuple(v), tuple(map(type, v.values())))
+                lines.append(f'{indent}if type({n}) is dict and (tuple({n}), tuple(map(type, {n}.values()))) == {shape}:')
+                self.compile_node(v, n, f'{prefix}{k}.', depth + 1, lines, constants)
+                lines.append(f'{indent}else:')
+                lines.append(f'{indent}    flatten_value({n}, {flat_key}, result)')
+            elif type(v) is list and len(v) > 0 and type(v[0]) is str and v[0]:
+                # Lists of strings (like locations_found_at) are written out as the whole list
+                lines.append(f'{indent}if len({n}) > 0 and type({n}[0]) is str and {n}[0]:')
+                lines.append(f'{indent}    result[{flat_key}] = str({n})')
+                lines.append(f'{indent}elif {n}:')
+                lines.append(f'{indent}    flatten_value({n}, {flat_key}, result)')
+                lines.append(f'{indent}else:')
+                lines.append(f"{indent}    result[{flat_key}] = 'None'")
+            elif type(v) is dict or type(v) is list:
+                lines.append(f'{indent}if {n}:')
+                lines.append(f'{indent}    flatten_value({n}, {flat_key}, result)')
+                lines.append(f'{indent}else:')
+                lines.append(f"{indent}    result[{flat_key}] = 'None'")
+            else:
+                lines.append(f'{indent}result[{flat_key}] = str({n})')
+
+    # Adds a single value to result under flat_key, the slow (but still exact) way
+    def flatten_value(self, v, flat_key, result):
+        if type(v) is str:
+            result[flat_key] = v
+        elif isinstance(v, dict):
+            if len(v) > 0:
+                for k, value in v.items():
+                    self.flatten_value(value, f'{flat_key}.{k}', result)
+            else:
+                result[flat_key] = 'None'
+        elif isinstance(v, list):
+            if len(v) == 0:
+                result[flat_key] = 'None'
+                return
+
+            # Empty items are skipped, the first real item decides what we do
+            filled = [item for item in v if item]
+            if len(filled) == 0:
+                raise UnknownShape()
+            first = filled[0]
+            if not isinstance(first, (dict, list)):
+                # A list of values is written out as the whole list
+                result[flat_key] = str(v)
+            elif len(filled) > 1:
+                # Lists of several dictionaries/lists get flattened in their own special way
+                raise UnknownShape()
+            elif isinstance(first, dict):
+                for k, value in first.items():
+                    self.flatten_value(value, f'{flat_key}.{k}', result)
+            else:
+                result[flat_key] = '.'.join(first)
+        else:
+            result[flat_key] = str(v)
 
     # My special dictionary flattening function.
     # Magic is magic
@@ -376,17 +1299,103 @@ class CanaData:
         # Set searchSlug to City/State provided
         self.searchSlug = search
 
-    # Function recieves a filename & dataset (list of dictionaries)
-    def csv_maker(self, filename, data, preorganized=False):
+    # Function returns the folder for today's run (CanaData_<date>), creating it if needed
+    def outputFolder(self):
         today = datetime.today().strftime('%m-%d-%Y')
-        # Variable on where to save the file
-        home_dir = f'{path[0]}/CanaData_{today}'
+        home_dir = f'{self.dataFolder}/CanaData_{today}'
 
         # Check if the folder exists
         if not ospath.exists(home_dir):
             # If not exist, create
             makedirs(home_dir)
 
+        return home_dir
+
+    # Finds the slug's results CSV from the most recent run before today (None if there isn't one)
+    def previousResults(self):
+        today = datetime.today().strftime('%m-%d-%Y')
+        runs = []
+        for folder in listdir(self.dataFolder):
+            if not folder.startswith('CanaData_') or folder == f'CanaData_{today}':
+                continue
+            try:
+                run_date = datetime.strptime(folder[len('CanaData_'):], '%m-%d-%Y')
+            except ValueError:
+                continue
+            results = f'{self.dataFolder}/{folder}/{self.searchSlug}_results.csv'
+            if ospath.exists(results):
+                runs.append((run_date, results))
+
+        if len(runs) == 0:
+            return None
+        return max(runs)[1]
+
+    # Function opens the slug's journal (<slug>_journal.jsonl), loading what's already in it when resuming
+    def startJournal(self):
+        journal_file = self.journalFile = f'{self.outputFolder()}/{self.searchSlug}_journal.jsonl'
+
+        # Fresh run, fresh journal
+        if self.resume is False or not ospath.exists(journal_file):
+            self.journal = open(journal_file, 'w', encoding='utf-8')
+            return
+
+        print(f'Resuming {self.searchSlug} from {journal_file}')
+        # Number of bytes in the journal that are complete entries
+        good_bytes = 0
+        with open(journal_file, 'rb') as infile:
+            for line in infile:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('Unfinished line')
+                    entry = self.loadJson(line)
+                except ValueError:
+                    # Last line was probably cut off when we died, everything after it is lost anyway
+                    break
+                good_bytes += len(line)
+
+                # A page of locations, pick up the locations and where the next page starts
+                if 'locations' in entry:
+                    self.locations.extend(entry['locations'])
+                    self.locationsFound = entry['offset']
+                    self.maxLocations = entry['max']
+                # A menu we already pulled
+                elif 'menu' in entry:
+                    self.journaledMenus[entry['menu']] = entry['data']
+
+        print(f'Found {str(self.locationsFound)} locations & {str(len(self.journaledMenus))} menus in the journal')
+
+        # Chop off any cut off line, then keep adding onto the end of the journal
+        with open(journal_file, 'r+b') as outfile:
+            outfile.truncate(good_bytes)
+        self.journal = open(journal_file, 'a', encoding='utf-8')
+
+    # Function adds an entry (dict or already dumped JSON string) as a line in the journal
+    def writeJournal(self, entry):
+        if self.journal is None:
+            return
+
+        if not isinstance(entry, str):
+            entry = self.dumpJson(entry)
+
+        self.journal.write(entry + '\n')
+        # Flush right away so the entry survives if we die on the next listing
+        self.journal.flush()
+
+    # Function closes the journal file if one is open
+    # finished=True means every menu is in, the journal is only there to survive a crash so it's removed (unless something is left for -resume)
+    def closeJournal(self, finished=False):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            if finished is True and self.journalGaps is False:
+                remove(self.journalFile)
+        self.journalFile = None
+
+    # Function recieves a filename & dataset (list of dictionaries)
+    def csv_maker(self, filename, data, preorganized=False):
+        # Variable on where to save the file
+        home_dir = self.outputFolder()
+
         # Create CSV file as outfile
         with open(f'{home_dir}/{filename}.csv', 'w', newline='', encoding='utf-8') as outfile:
             # Setup csv writer with file
@@ -406,6 +1415,214 @@ class CanaData:
             # Print visual notification of finished export & number of items seen
             print(f'Successfully exported ({str(len(data))} items) to CSV -> {filename}.csv')
 
+    # Writes a Parquet copy of an exported CSV with real types
+    # prices.* columns are numbers, 'None' is null & category/brand columns are dictionary encoded
+    # The CSV is read back a chunk of rows at a time, so streamed exports stay out of memory here too
+    def parquet_maker(self, filename):
+        # Variable on where to save the file
+        home_dir = self.outputFolder()
+
+        with open(f'{home_dir}/{filename}.csv', newline='', encoding='utf-8') as infile:
+            rows = csv.reader(infile)
+
+            # Row 1 of the CSV decides the columns & their types
+            all_keys = next(rows)
+            schema = pyarrow.schema([(key, self.parquetType(key)) for key in all_keys])
+
+            count = 0
+            with parquet.ParquetWriter(f'{home_dir}/{filename}.parquet', schema, compression='zstd') as writer:
+                chunk = []
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) >= self.chunkRows:
+                        writer.write_table(self.parquetTable(chunk, schema))
+                        count += len(chunk)
+                        chunk = []
+                if len(chunk) > 0 or count == 0:
+                    writer.write_table(self.parquetTable(chunk, schema))
+                    count += len(chunk)
+
+        # Print visual notification of finished export & number of items seen
+        print(f'Successfully exported ({str(count)} items) to Parquet -> {filename}.parquet')
+
+    # The Parquet type for a column (by its name)
+    def parquetType(self, key):
+        if key.startswith('prices.'):
+            return pyarrow.float64()
+        if 'category' in key or 'brand' in key:
+            # Only a handful of different values, so each one is only stored once
+            return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        return pyarrow.string()
+
+    # Turns a chunk of CSV rows into a table of typed columns
+    def parquetTable(self, chunk, schema):
+        width = len(schema)
+        # Rows that don't have a value for every column get filled out with 'None' (extras are cut off)
+        rows = [row[:width] if len(row) >= width else row + ['None'] * (width - len(row)) for row in chunk]
+        columns = list(zip(*rows)) if len(rows) > 0 else [()] * width
+
+        arrays = []
+        for field, values in zip(schema, columns):
+            if field.type == pyarrow.float64():
+                values = [self.priceNumber(value) for value in values]
+            else:
+                values = [None if value == 'None' else value for value in values]
+            arrays.append(pyarrow.array(values, type=field.type))
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    # A price out of a flat item as a number (None when there isn't one)
+    def priceNumber(self, value):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    # Writes <slug>_delta.csv with what changed since the slug's last run: new items, removed items & every price that changed
+    # Items are matched up by listing id + item id, the last run is read into a table of just the prices (one row at a time)
+    # and today's items are checked against it as they go by, so neither side is ever fully in memory
+    def delta_maker(self):
+        previous_file = self.previousResults()
+        if previous_file is None:
+            print(f'No earlier results for {self.searchSlug}, nothing to compare to yet!')
+            return
+
+        # (listing id, item id) -> (name, prices) from the last run
+        previous = {}
+        with open(previous_file, newline='', encoding='utf-8') as infile:
+            for item in csv.DictReader(infile):
+                previous[(item.get('listing_id'), item.get('id'))] = (item.get('name'), tuple(item.get(f'prices.{weight}', 'None') for weight in self.priceWeights))
+
+        new_items = 0
+        price_changes = 0
+        with open(f'{self.outputFolder()}/{self.searchSlug}_delta.csv', 'w', newline='', encoding='utf-8') as outfile:
+            # Setup csv writer with file
+            output = csv.writer(outfile)
+            output.writerow(['change', 'listing_id', 'id', 'name', 'weight', 'old_price', 'new_price'])
+
+            # Items already checked (the same item can show up twice on a menu)
+            checked = set()
+            for item in self.iterResultRows():
+                key = (item.get('listing_id'), item.get('id'))
+                if key in checked:
+                    continue
+                checked.add(key)
+                prices = tuple(item.get(f'prices.{weight}', 'None') for weight in self.priceWeights)
+                old = previous.pop(key, None)
+
+                if old is None:
+                    output.writerow(['new', key[0], key[1], item.get('name'), 'None', 'None', 'None'])
+                    new_items += 1
+                    continue
+
+                # Only prices that are actually different numbers count ('10' and '10.0' are the same price)
+                for weight, old_price, new_price in zip(self.priceWeights, old[1], prices):
+                    if old_price != new_price and self.priceNumber(old_price) != self.priceNumber(new_price):
+                        output.writerow(['price', key[0], key[1], item.get('name'), weight, old_price, new_price])
+                        price_changes += 1
+
+            # Anything left from the last run wasn't on today's menus
+            for key, old in previous.items():
+                output.writerow(['removed', key[0], key[1], old[0], 'None', 'None', 'None'])
+
+        # Print visual notification of finished export & how much changed
+        print(f'Successfully exported delta ({str(new_items)} new, {str(len(previous))} removed, {str(price_changes)} price changes) to CSV -> {self.searchSlug}_delta.csv')
+
+    # Gives back every finished (flat) menu item one at a time, streamed exports are read back from their CSV
+    def iterResultRows(self):
+        if self.streamExport is not True:
+            yield from self.finishedMenuItems
+            return
+
+        if self.streamCount == 0:
+            return
+        with open(f'{self.outputFolder()}/{self.searchSlug}_results.csv', newline='', encoding='utf-8') as infile:
+            yield from csv.DictReader(infile)
+
+    # Saves the slug's listings & menu items into the SQLite database at sqlitePath
+    # Listings & items are upserted (by listing id & item id), every item's prices are added to the price history
+    def sqlite_maker(self):
+        seen_at = datetime.now().isoformat(timespec='seconds')
+        weights = ', '.join(self.priceWeights)
+        weight_slots = ', '.join('?' for weight in self.priceWeights)
+        weight_updates = ', '.join(f'{weight} = excluded.{weight}' for weight in self.priceWeights)
+
+        connection = sqlite3.connect(self.sqlitePath, timeout=60)
+        try:
+            # Everything for a slug goes in at once (or not at all)
+            with connection:
+                self.sqliteSetup(connection)
+
+                connection.executemany(
+                    'INSERT INTO listings (listing_id, wmid, slug, listing_slug, name, type, data, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (listing_id) DO UPDATE SET wmid = excluded.wmid, slug = excluded.slug, listing_slug = excluded.listing_slug, name = excluded.name, '
+                    'type = excluded.type, data = excluded.data, last_seen = excluded.last_seen',
+                    [(listing.get('id'), listing.get('wmid'), self.searchSlug, listing.get('slug'), listing.get('name'), listing.get('_type', listing.get('type')),
+                      json.dumps(listing, default=str), seen_at, seen_at) for listing in self.totalLocations])
+
+                items = 0
+                chunk = []
+                for item in self.iterResultRows():
+                    chunk.append(item)
+                    if len(chunk) >= self.chunkRows:
+                        self.sqliteItems(connection, chunk, seen_at, weights, weight_slots, weight_updates)
+                        items += len(chunk)
+                        chunk = []
+                self.sqliteItems(connection, chunk, seen_at, weights, weight_slots, weight_updates)
+                items += len(chunk)
+        finally:
+            connection.close()
+
+        # Print visual notification of finished export & number of items seen
+        print(f'Successfully saved ({str(len(self.totalLocations))} listings & {str(items)} items) to SQLite -> {self.sqlitePath}')
+
+    # Creates the tables & indexes if the database doesn't have them yet
+    def sqliteSetup(self, connection):
+        prices = ''.join(f', {weight} REAL' for weight in self.priceWeights)
+        connection.execute('CREATE TABLE IF NOT EXISTS listings (listing_id INTEGER PRIMARY KEY, wmid INTEGER, slug TEXT, listing_slug TEXT, name TEXT, type TEXT, data TEXT, first_seen TEXT, last_seen TEXT)')
+        connection.execute(f'CREATE TABLE IF NOT EXISTS menu_items (listing_id INTEGER, item_id INTEGER, slug TEXT, name TEXT, category TEXT, brand TEXT{prices}, data TEXT, first_seen TEXT, last_seen TEXT, PRIMARY KEY (listing_id, item_id))')
+        connection.execute(f'CREATE TABLE IF NOT EXISTS price_history (listing_id INTEGER, item_id INTEGER, slug TEXT, category TEXT, seen_at TEXT{prices})')
+
+        connection.execute('CREATE INDEX IF NOT EXISTS listings_slug ON listings (slug)')
+        connection.execute('CREATE INDEX IF NOT EXISTS menu_items_slug ON menu_items (slug)')
+        connection.execute('CREATE INDEX IF NOT EXISTS menu_items_category ON menu_items (category)')
+        connection.execute('CREATE INDEX IF NOT EXISTS price_history_slug ON price_history (slug, seen_at)')
+        connection.execute('CREATE INDEX IF NOT EXISTS price_history_category ON price_history (category, seen_at)')
+        connection.execute('CREATE INDEX IF NOT EXISTS price_history_item ON price_history (listing_id, item_id, seen_at)')
+        # "Cheapest eighth in colorado" only has to walk the index
+        for weight in self.priceWeights:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS menu_items_{weight} ON menu_items ({weight})')
+            connection.execute(f'CREATE INDEX IF NOT EXISTS price_history_{weight} ON price_history (slug, {weight})')
+
+    # Upserts a chunk of flat menu items & adds their prices to the price history
+    def sqliteItems(self, connection, chunk, seen_at, weights, weight_slots, weight_updates):
+        if len(chunk) == 0:
+            return
+
+        # The category & brand columns depend on what Weedmaps sent back
+        category_key = next((key for key in self.categoryKeys if key in chunk[0]), None)
+        brand_key = next((key for key in self.brandKeys if key in chunk[0]), None)
+
+        items = []
+        history = []
+        for item in chunk:
+            category = self.sqliteText(item.get(category_key))
+            prices = [self.priceNumber(item.get(f'prices.{weight}', 'None')) for weight in self.priceWeights]
+            items.append((item.get('listing_id'), item.get('id'), self.searchSlug, self.sqliteText(item.get('name')), category, self.sqliteText(item.get(brand_key)),
+                          *prices, json.dumps(item), seen_at, seen_at))
+            history.append((item.get('listing_id'), item.get('id'), self.searchSlug, category, seen_at, *prices))
+
+        connection.executemany(
+            f'INSERT INTO menu_items (listing_id, item_id, slug, name, category, brand, {weights}, data, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, {weight_slots}, ?, ?, ?) '
+            f'ON CONFLICT (listing_id, item_id) DO UPDATE SET slug = excluded.slug, name = excluded.name, category = excluded.category, brand = excluded.brand, '
+            f'{weight_updates}, data = excluded.data, last_seen = excluded.last_seen', items)
+        connection.executemany(f'INSERT INTO price_history (listing_id, item_id, slug, category, seen_at, {weights}) VALUES (?, ?, ?, ?, ?, {weight_slots})', history)
+
+    # 'None' (how a flat item says there's nothing there) is saved as null
+    def sqliteText(self, value):
+        if value is None or value == 'None':
+            return None
+        return value
+
     # Function determines whether or not a CSV should be made
     def dataToCSV(self):
         # If the state was not friendly for listings, skip making CSV
@@ -414,19 +1631,160 @@ class CanaData:
 
         # Try to make a CSV of the dataset, try because sometimes will fail if Locations exist with 0 menu items
         try:
-            self.csv_maker(f'{self.searchSlug}_results', self.finishedMenuItems)
+            with self.metrics.phase('csv_write', self.itemCount()):
+                if self.streamExport is True:
+                    self.streamToCSV(f'{self.searchSlug}_results')
+                else:
+                    self.csv_maker(f'{self.searchSlug}_results', self.finishedMenuItems)
+            if self.parquetExport is True:
+                with self.metrics.phase('parquet', self.itemCount()):
+                    self.parquet_maker(f'{self.searchSlug}_results')
         except Exception as e:
             print(f'Error: {str(e)}')
             print('^^ Probably were no actual items (if error says \'list index out of range\')')
 
         # Listing dataset typically has values regardless of empty menus, turn that dataset into a CSV
         try:
-            self.csv_maker(f'{self.searchSlug}_total_listings', self.totalLocations)
+            with self.metrics.phase('listings_csv', len(self.totalLocations)):
+                self.csv_maker(f'{self.searchSlug}_total_listings', self.totalLocations)
+            if self.parquetExport is True:
+                with self.metrics.phase('parquet', len(self.totalLocations)):
+                    self.parquet_maker(f'{self.searchSlug}_total_listings')
         except Exception as e:
             print(f'Error: {str(e)}')
             print('^^ Musta been a bad search query? (if error says \'list index out of range\')')
 
+        # Compare against the last run
+        if self.deltaExport is True:
+            try:
+                with self.metrics.phase('delta', self.itemCount()):
+                    self.delta_maker()
+            except (OSError, csv.Error) as e:
+                print(f'Error: {str(e)}')
+                print('^^ Couldn\'t work out what changed since the last run!')
+
+        # Save everything into the SQLite database too
+        if self.sqlitePath is not None:
+            try:
+                with self.metrics.phase('sqlite', self.itemCount()):
+                    self.sqlite_maker()
+            except sqlite3.Error as e:
+                print(f'Error: {str(e)}')
+                print('^^ Couldn\'t save to the SQLite database, the CSV\'s are still there!')
+
         print(f'\n\nResults for -> {self.searchSlug}:\n- {str(self.locationsFound)} Locations\n- {str(len(self.allMenuItems.keys()))} Menus\n- {str(len(self.emptyMenus.keys()))} Empty Menus\n- {str(self.menuItemsFound)} Menu Items')
+        if self.dedupItems is True:
+            print(f'- {str(self.duplicatesDropped)} Duplicate Items Merged ({str(len(self.mergedLocations))} items found at more than one location)')
+
+    # Runs every step for a single slug (locations -> menus -> CSV's) then resets for the next one
+    def runSlug(self, slug):
+        # Visual queue of starting a state
+        print(f'\n\nStarting on {slug}')
+        # Set our searchSlug to the State we are working on
+        self.setCitySlug(slug)
+        # Fresh numbers for every slug
+        self.metrics = CanaMetrics('canadata', {'slug': slug})
+        # Get the locations for the given slug
+        with self.metrics.phase('locations'):
+            self.getLocations()
+        self.metrics.addItems('locations', len(self.locations))
+        # Get the Menus for the locations found
+        self.getMenus()
+        # Convert our Datasets to CSV's (1 for Menu Items & 1 for Listing Info)
+        self.dataToCSV()
+        # Print how well we reused our connections for this slug
+        self.reportConnections()
+        # Save & print how long each step took
+        self.saveMetrics()
+        # Reset the self variables to avoid using old data from other states/slugs
+        self.resetDataSets()
+
+    # Saves this slug's metrics next to its CSV's (and as a Prometheus textfile if we were asked to) & prints them
+    def saveMetrics(self):
+        try:
+            self.metrics.writeJson(f'{self.outputFolder()}/{self.searchSlug}_metrics.json')
+            if self.promFolder is not None:
+                self.metrics.writePrometheus(f'{self.promFolder}/canadata_{self.searchSlug}.prom')
+        except OSError as e:
+            print(f'Error: {str(e)}')
+            print('^^ Couldn\'t save the metrics!')
+        print(f'\nTimings for -> {self.searchSlug}:')
+        self.metrics.report()
+
+    # Number of item rows this slug ended up with (streamed rows are only counted)
+    def itemCount(self):
+        return self.streamCount if self.streamExport is True else len(self.finishedMenuItems)
+
+    # Prints progress for each listing/menu (skipped in quiet mode)
+    def progress(self, message):
+        if self.quiet is False:
+            print(message)
+
+    # Runs every slug in the list, spreading them over worker processes if we were asked to
+    def runSlugs(self, searchSlugs):
+        searchSlugs = [slug for slug in searchSlugs if len(slug) > 0]
+
+        # One at a time on this instance
+        if self.slugProcesses <= 1:
+            for slug in searchSlugs:
+                self.runSlug(slug)
+            return
+
+        # Each worker process gets its own CanaData (with our settings) per slug
+        settings = {name: getattr(self, name) for name in self.settingNames}
+        with ProcessPoolExecutor(max_workers=self.slugProcesses) as executor:
+            # Results come back in slug order so the naughty list stays in the same order as a normal run
+            for unFriendlyStates in executor.map(processSlug, repeat(settings), searchSlugs):
+                self.unFriendlyStates.extend(unFriendlyStates)
+
+    # Yields what we find for a slug as each menu comes in, with nothing written out (for using CanaData from other scripts)
+    # The journal is only kept when resuming, only the response cache (see setDataFolder & noCache) touches the disk
+    # ('listing', listing info) comes first for every listing (same as a row of the listings CSV), then ('item', flat item) for each of its items
+    # Items are flattened exactly like the results CSV, only without the 'None' filled in for keys they don't have
+    def iterSlug(self, slug):
+        self.setCitySlug(slug)
+        self.metrics = CanaMetrics('canadata', {'slug': slug})
+        # Listings we already gave back (same listing twice in our locations)
+        seenListings = set()
+        menus = None
+
+        try:
+            with self.metrics.phase('locations'):
+                self.getLocations(journal=self.resume)
+            self.metrics.addItems('locations', len(self.locations))
+            if self.NonGreenState is True:
+                return
+
+            # Menus are timed from the first one to the last (along with whatever the caller does with them in between)
+            menusStart = time.perf_counter()
+            location_count = 0
+            menus = self.iterMenus()
+            for menuJsonData in menus:
+                location_count += 1
+                items = self.processMenu(menuJsonData, keepItems=False)
+                if menuJsonData['listing']['id'] in seenListings:
+                    continue
+                seenListings.add(menuJsonData['listing']['id'])
+
+                yield 'listing', menuJsonData['listing']
+                for item in items:
+                    yield 'item', self.flatten_fast(item)
+
+            # Every menu is in, the journal (only kept when resuming) isn't needed anymore
+            self.closeJournal(finished=True)
+            self.metrics.addPhase('menus', time.perf_counter() - menusStart, location_count)
+        finally:
+            # Whether we finished or were stopped early, stop pulling menus & get ready for the next slug
+            if menus is not None:
+                menus.close()
+            self.resetDataSets()
+
+    # Yields (slug, 'listing' or 'item', data) for every slug in the list, one slug after the other (see iterSlug)
+    # Slugs with no listings end up in unFriendlyStates like a normal run
+    def scrape(self, searchSlugs):
+        for slug in searchSlugs:
+            for kind, data in self.iterSlug(slug.lower().replace(' ', '-')):
+                yield slug, kind, data
 
     # Since we loop through states in the "All" option, we have to reset some values
     def resetDataSets(self):
@@ -446,6 +1804,20 @@ class CanaData:
         self.totalLocations = []
         # Reset the NonGreenState Status to False
         self.NonGreenState = False
+        # Close the journal & forget any menus left over from it
+        self.closeJournal()
+        self.journaledMenus = {}
+        self.journalGaps = False
+        # Reset the streaming spool
+        if self.streamFile is not None:
+            self.streamFile.close()
+            self.streamFile = None
+        self.streamKeys = {}
+        self.streamCount = 0
+        # Forget the items kept for de-duplication
+        self.itemHashes = {}
+        self.mergedLocations = {}
+        self.duplicatesDropped = 0
 
     # Function to announce the # of non Cannabis friendly states (0 listings in state)
     def identifyNaughtyStates(self):
@@ -475,6 +1847,160 @@ class CanaData:
         print('Set Troubleshooting Mode to True')
         self.testMode = True
 
+    # Sets the number of menus we pull at the same time
+    def setMenuWorkers(self, workers):
+        print(f'Set menu workers to {str(workers)}')
+        self.menuWorkers = max(1, int(workers))
+        # Rebuild our session so there are enough connections for every worker
+        self.buildSession()
+
+    # Sets the most pages of listings we pull at the same time
+    def setLocationWorkers(self, workers):
+        print(f'Set location workers to {str(workers)}')
+        self.locationWorkers = max(1, int(workers))
+        # Rebuild our session so there are enough connections for every worker
+        self.buildSession()
+
+    # Sets the area we find locations in (south,west,north,east)
+    def setBoundingBox(self, box):
+        south, west, north, east = [float(value) for value in box.split(',')]
+        self.boundingBox = (min(south, north), min(west, east), max(south, north), max(west, east))
+        print(f'Set bounding box to {self.boxText(self.boundingBox)}, locations are found tile by tile!')
+
+    # Sets the area we find locations in to the miles around a point (lat,long or lat,long,miles)
+    def setNear(self, point):
+        values = [float(value) for value in point.split(',')]
+        if len(values) > 2:
+            self.nearMiles = values[2]
+        print(f'Set search area to {str(self.nearMiles)} miles around {str(values[0])},{str(values[1])}')
+        self.boundingBox = self.nearBox(values[0], values[1])
+
+    # Sets how many tiles across (and down) the area is split into
+    def setTiles(self, tiles):
+        print(f'Set tiles to {str(tiles)}x{str(tiles)}')
+        self.tiles = max(1, int(tiles))
+
+    # Sets the attribute for resuming from the journal
+    def setResume(self):
+        print('Set resume to True, picking up from the journal where we can!')
+        self.resume = True
+
+    # Sets the attribute for streaming menu items out as they come in
+    def stream(self):
+        print('Set streaming export to True, items get written out as each menu comes in!')
+        self.streamExport = True
+
+    # Sets the attribute for writing Parquet files next to the CSV's
+    def parquetFiles(self):
+        if pyarrow is None:
+            print('Parquet export needs pyarrow (pip install pyarrow), sticking to CSV\'s!')
+            return
+        print('Set Parquet export to True, a .parquet file gets written next to each CSV!')
+        self.parquetExport = True
+
+    # Sets where listings are pulled from (like a local CanaServer.py)
+    def setBaseUrl(self, baseUrl):
+        print(f'Set listings URL to {baseUrl}')
+        self.baseUrl = baseUrl.rstrip('/')
+
+    # Sets where menus are pulled from (<menuBaseUrl>/<listing slug>/menu)
+    def setMenuUrl(self, menuBaseUrl):
+        print(f'Set menus URL to {menuBaseUrl}')
+        self.menuBaseUrl = menuBaseUrl.rstrip('/')
+
+    # Sets the folder every response gets recorded into
+    def setRecordFolder(self, recordFolder):
+        print(f'Set record folder to {recordFolder}, every listings page & menu gets saved there!')
+        self.recordFolder = recordFolder
+
+    # Sets the attribute for writing what changed since the last run
+    def delta(self):
+        print('Set delta to True, what changed since the last run gets written to <slug>_delta.csv!')
+        self.deltaExport = True
+
+    # Sets the SQLite database every slug gets saved into
+    def setSqlite(self, sqlitePath):
+        print(f'Set SQLite database to {sqlitePath}')
+        self.sqlitePath = sqlitePath
+
+    # Sets the attribute for skipping the per-listing prints
+    def setQuiet(self):
+        print('Set quiet to True, only the important stuff gets printed!')
+        self.quiet = True
+
+    # Sets the folder Prometheus textfiles get written to (node_exporter's --collector.textfile.directory)
+    def setPromFolder(self, promFolder):
+        print(f'Set Prometheus textfile folder to {promFolder}')
+        self.promFolder = promFolder
+
+    # Sets the attribute for merging identical items from different listings
+    def dedupe(self):
+        print('Set dedup to True, identical items from different listings become one row!')
+        self.dedupItems = True
+
+    # Sets the most times we try the same request before giving up on it
+    def setRetries(self, attempts):
+        print(f'Set max attempts per request to {str(attempts)}')
+        self.retryPolicy.max_attempts = max(1, int(attempts))
+
+    # Sets the folder the CanaData_<date> folders & the response cache go in
+    def setDataFolder(self, folder):
+        print(f'Set data folder to {folder}')
+        self.dataFolder = folder
+        self.buildCache()
+
+    # Turns off the response cache
+    def noCache(self):
+        print('Set cache to off, every request goes to Weedmaps!')
+        self.useCache = False
+        self.buildCache()
+
+    # Skips reading the cache so every response is fresh (and saved for next time)
+    def refresh(self):
+        print('Set cache refresh to True, pulling fresh responses!')
+        self.refreshCache = True
+
+    # Sets how many seconds cached responses are good for
+    def setCacheTtl(self, seconds):
+        print(f'Set cache TTL to {str(seconds)} seconds')
+        self.cacheTtl = float(seconds)
+        self.buildCache()
+
+    # Sets how big the cache folder can get (in megabytes)
+    def setCacheSize(self, megabytes):
+        print(f'Set cache size to {str(megabytes)} MB')
+        self.cacheSize = float(megabytes)
+        self.buildCache()
+
+    # Sets the number of slugs we work on at the same time
+    def setSlugProcesses(self, processes):
+        print(f'Set slug processes to {str(processes)}')
+        self.slugProcesses = max(1, int(processes))
+
+    # Sets the number of connections we keep open per host
+    def setPoolSize(self, size):
+        print(f'Set connection pool size to {str(size)}')
+        self.poolSize = max(1, int(size))
+        self.buildSession()
+
+    # Sets the number of seconds to wait on a request
+    def setTimeout(self, seconds):
+        print(f'Set request timeout to {str(seconds)} seconds')
+        self.timeout = float(seconds)
+
+
+# Runs a single slug on a fresh CanaData inside a worker process & hands back the slugs with no listings
+def processSlug(settings, slug):
+    cana = CanaData()
+    # Copy the settings from the main process over to our instance
+    for name, value in settings.items():
+        setattr(cana, name, value)
+    # Rebuild the session & cache now that our settings are in place
+    cana.buildSession()
+    cana.buildCache()
+    cana.runSlug(slug)
+    return cana.unFriendlyStates
+
 
 if __name__ == '__main__':
     # Initiate the Library
@@ -515,6 +2041,90 @@ if __name__ == '__main__':
         if '-slugs' in argList:
             cana.slugs()
 
+        # This looks for the number of menus to pull at the same time (-workers 8)
+        if '-workers' in argList:
+            cana.setMenuWorkers(argList[argList.index('-workers') + 1])
+
+        # This looks for the most pages of listings to pull at the same time (-pageworkers 8)
+        if '-pageworkers' in argList:
+            cana.setLocationWorkers(argList[argList.index('-pageworkers') + 1])
+
+        # These look for an area to find locations in tile by tile (-bbox 39.6,-105.1,39.9,-104.8 or -near 39.74,-104.99,15) & how to split it up (-tiles 4)
+        if '-bbox' in argList:
+            cana.setBoundingBox(argList[argList.index('-bbox') + 1])
+        if '-near' in argList:
+            cana.setNear(argList[argList.index('-near') + 1])
+        if '-tiles' in argList:
+            cana.setTiles(argList[argList.index('-tiles') + 1])
+
+        # This looks to see if we should pick up where the last run left off
+        if '-resume' in argList:
+            cana.setResume()
+
+        # This looks to see if we should stream items out instead of holding them all in memory
+        if '-stream' in argList:
+            cana.stream()
+
+        # This looks to see if we should write Parquet files too
+        if '-parquet' in argList:
+            cana.parquetFiles()
+
+        # This looks for other places to pull listings & menus from (-baseurl http://127.0.0.1:8000/discovery/v1/listings)
+        if '-baseurl' in argList:
+            cana.setBaseUrl(argList[argList.index('-baseurl') + 1])
+        if '-menuurl' in argList:
+            cana.setMenuUrl(argList[argList.index('-menuurl') + 1])
+
+        # This looks for a folder to record every response into (-record recordings)
+        if '-record' in argList:
+            cana.setRecordFolder(argList[argList.index('-record') + 1])
+
+        # This looks to see if we should write what changed since the last run
+        if '-delta' in argList:
+            cana.delta()
+
+        # This looks for a SQLite database to save into (-sqlite canadata.db)
+        if '-sqlite' in argList:
+            cana.setSqlite(argList[argList.index('-sqlite') + 1])
+
+        # This looks to see if we should merge identical items found at different listings
+        if '-dedup' in argList:
+            cana.dedupe()
+
+        # This looks to see if we should skip the per-listing prints
+        if '-quiet' in argList:
+            cana.setQuiet()
+
+        # This looks for a folder to write Prometheus textfiles into (-prom /var/lib/node_exporter/textfile_collector)
+        if '-prom' in argList:
+            cana.setPromFolder(argList[argList.index('-prom') + 1])
+
+        # This looks for the most times to try the same request (-retries 5)
+        if '-retries' in argList:
+            cana.setRetries(argList[argList.index('-retries') + 1])
+
+        # These look at how we should use the response cache
+        if '-nocache' in argList:
+            cana.noCache()
+        if '-refresh' in argList:
+            cana.refresh()
+        if '-cachettl' in argList:
+            cana.setCacheTtl(argList[argList.index('-cachettl') + 1])
+        if '-cachesize' in argList:
+            cana.setCacheSize(argList[argList.index('-cachesize') + 1])
+
+        # This looks for the number of slugs to work on at the same time (-procs 4)
+        if '-procs' in argList:
+            cana.setSlugProcesses(argList[argList.index('-procs') + 1])
+
+        # This looks for the number of connections to keep open per host (-poolsize 20)
+        if '-poolsize' in argList:
+            cana.setPoolSize(argList[argList.index('-poolsize') + 1])
+
+        # This looks for the number of seconds to wait on each request (-timeout 30)
+        if '-timeout' in argList:
+            cana.setTimeout(argList[argList.index('-timeout') + 1])
+
     # This specifically looks for the quick run argument and sets the State list
     if '-go' in argList:
         # Search slug location in args is after the -go
@@ -553,21 +2163,8 @@ if __name__ == '__main__':
             # State list is set to a single item list of what the user input
             searchSlugs = [answer]
 
-    # This Loop fires no matter what to process all search slugs provided either manually or through a .txt file!
+    # This fires no matter what to process all search slugs provided either manually or through a .txt file!
     # Fun functions against them all!
-    for slug in searchSlugs:
-        if len(slug) > 0:
-            # Visual queue of starting a state
-            print(f'\n\nStarting on {slug}')
-            # Set our searchSlug to the State we are working on
-            cana.setCitySlug(slug)
-            # Get the locations for the given slug
-            cana.getLocations()
-            # Get the Menus for the locations found
-            cana.getMenus()
-            # Convert our Datasets to CSV's (1 for Menu Items & 1 for Listing Info)
-            cana.dataToCSV()
-            # Reset the self variables to avoid using old data from other states/slugs
-            cana.resetDataSets()
+    cana.runSlugs(searchSlugs)
     # Print out the list of Non-Cannabis friendly states
     cana.identifyNaughtyStates()
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+# Timings & counts for each phase of a CanaData/CanaParse run, saved as a JSON summary and (optionally) a Prometheus textfile
+# Only uses the standard library so CanaParse can use it without pulling in CanaData's requirements
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from os import path as ospath
+from os import makedirs
+from os import replace
+import json
+import time
+import sys
+
+# Peak memory comes from resource, which Windows doesn't have
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Holds the numbers for one run (one slug for CanaData, one CSV for CanaParse)
+class CanaMetrics:
+    def __init__(self, job, labels={}):
+        # Name every metric starts with (canadata / canaparse) & labels added to every metric (like the slug)
+        self.job = job
+        self.labels = dict(labels)
+        # Phase name -> seconds, items & number of times it ran (in the order they first ran)
+        self.phases = {}
+        # Requests made, ones that failed, bytes that came over the wire (still gzipped) & how long each took
+        self.requests = 0
+        self.requestErrors = 0
+        self.requestBytes = 0
+        self.latencies = []
+        # Responses answered by the cache instead of the network
+        self.cacheHits = 0
+        self.started = time.time()
+        self.lock = Lock()
+
+    # Times everything inside the with block as the named phase (a phase can run more than once, it all adds up)
+    @contextmanager
+    def phase(self, name, items=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addPhase(name, time.perf_counter() - start, items)
+
+    # Adds time and/or items to a phase
+    def addPhase(self, name, seconds, items=0):
+        with self.lock:
+            phase = self.phases.setdefault(name, {'seconds': 0.0, 'items': 0, 'runs': 0})
+            phase['seconds'] += seconds
+            phase['items'] += items
+            phase['runs'] += 1
+
+    # Adds items to a phase without timing anything (for when the count is only known after the with block)
+    def addItems(self, name, items):
+        with self.lock:
+            phase = self.phases.setdefault(name, {'seconds': 0.0, 'items': 0, 'runs': 0})
+            phase['items'] += items
+
+    # Records a single HTTP request (size is None when it failed before there was a response)
+    def request(self, seconds, size=None, failed=False):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+            if size is not None:
+                self.requestBytes += size
+            if failed is True:
+                self.requestErrors += 1
+
+    # Records a response that came out of the cache
+    def cacheHit(self):
+        with self.lock:
+            self.cacheHits += 1
+
+    # The latency below which the given fraction of requests finished (nearest rank)
+    def percentile(self, fraction):
+        if len(self.latencies) == 0:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+    # Most memory this process has used so far (in bytes, None if we can't tell)
+    # It's the whole process' high water mark, so with more than one slug in a process it's the biggest so far, not this slug's own
+    def peakRss(self):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    # Everything as a dictionary (what goes in the JSON file)
+    def summary(self):
+        phases = {}
+        for name, phase in self.phases.items():
+            phases[name] = {
+                'seconds': round(phase['seconds'], 4),
+                'items': phase['items'],
+                'items_per_second': round(phase['items'] / phase['seconds'], 1) if phase['items'] > 0 and phase['seconds'] > 0 else None,
+                'runs': phase['runs'],
+            }
+
+        return {
+            'job': self.job,
+            'labels': self.labels,
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'seconds': round(time.time() - self.started, 4),
+            'phases': phases,
+            'requests': {
+                'count': self.requests,
+                'errors': self.requestErrors,
+                'bytes': self.requestBytes,
+                'cache_hits': self.cacheHits,
+                'latency_seconds': {quantile: self.rounded(self.percentile(fraction)) for quantile, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))},
+            },
+            'process_peak_rss_bytes': self.peakRss(),
+        }
+
+    # Seconds rounded for the summary (None stays None)
+    def rounded(self, value):
+        return round(value, 4) if value is not None else None
+
+    # Saves the summary as JSON
+    def writeJson(self, json_file):
+        makedirs(ospath.dirname(ospath.abspath(json_file)), exist_ok=True)
+        with open(json_file, 'w', encoding='utf-8') as outfile:
+            json.dump(self.summary(), outfile, indent=2)
+
+    # Saves the summary in Prometheus' text format (for node_exporter's textfile collector)
+    # The file is written next to where it goes & then moved in, so the collector never reads half a file
+    def writePrometheus(self, prom_file):
+        summary = self.summary()
+        job = self.job
+        lines = []
+
+        # Adds a metric's HELP/TYPE lines & its values ([(extra labels, value)])
+        def metric(name, kind, help_text, values):
+            lines.append(f'# HELP {job}_{name} {help_text}')
+            lines.append(f'# TYPE {job}_{name} {kind}')
+            for extra, value in values:
+                if value is not None:
+                    lines.append(f'{job}_{name}{self.labelText(extra)} {str(value)}')
+
+        metric('last_run_timestamp_seconds', 'gauge', 'When the run finished.', [({}, round(time.time(), 3))])
+        metric('run_seconds', 'gauge', 'How long the whole run took.', [({}, summary['seconds'])])
+        metric('phase_seconds', 'gauge', 'Time spent in each phase.', [({'phase': name}, phase['seconds']) for name, phase in summary['phases'].items()])
+        metric('phase_items', 'gauge', 'Items worked through in each phase.', [({'phase': name}, phase['items']) for name, phase in summary['phases'].items()])
+        metric('phase_items_per_second', 'gauge', 'Throughput of each phase.', [({'phase': name}, phase['items_per_second']) for name, phase in summary['phases'].items()])
+        metric('requests', 'gauge', 'HTTP requests made.', [({}, self.requests)])
+        metric('request_errors', 'gauge', 'HTTP requests that failed.', [({}, self.requestErrors)])
+        metric('request_bytes', 'gauge', 'Bytes downloaded (as sent over the wire).', [({}, self.requestBytes)])
+        metric('cache_hits', 'gauge', 'Responses answered by the cache.', [({}, self.cacheHits)])
+        metric('request_latency_seconds', 'gauge', 'Request latency percentiles.', [({'quantile': quantile}, value) for quantile, value in (('0.5', self.percentile(0.5)), ('0.9', self.percentile(0.9)), ('0.99', self.percentile(0.99)))])
+        metric('process_peak_rss_bytes', 'gauge', 'Most memory the process has used (process wide, not per slug).', [({}, summary['process_peak_rss_bytes'])])
+
+        makedirs(ospath.dirname(ospath.abspath(prom_file)), exist_ok=True)
+        with open(f'{prom_file}.tmp', 'w', encoding='utf-8') as outfile:
+            outfile.write('\n'.join(lines) + '\n')
+        replace(f'{prom_file}.tmp', prom_file)
+
+    # {label="value",...} with our labels + the extra ones
+    def labelText(self, extra):
+        labels = dict(self.labels)
+        labels.update(extra)
+        if len(labels) == 0:
+            return ''
+        return '{' + ','.join(f'{key}="{self.escapeLabel(value)}"' for key, value in labels.items()) + '}'
+
+    # Label values can't have raw backslashes, quotes or new lines in them
+    def escapeLabel(self, value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    # One line per phase for the terminal
+    def report(self):
+        summary = self.summary()
+        for name, phase in summary['phases'].items():
+            rate = f' ({str(phase["items_per_second"])} items/s)' if phase['items_per_second'] is not None else ''
+            print(f'- {name}: {phase["seconds"]:.2f}s{rate}')
+        if self.requests > 0:
+            latency = summary['requests']['latency_seconds']
+            print(f'- {str(self.requests)} Requests ({str(self.requestErrors)} failed, {str(round(self.requestBytes / 1024 / 1024, 2))} MB), latency p50 {str(latency["p50"])}s / p90 {str(latency["p90"])}s / p99 {str(latency["p99"])}s')
@@ -0,0 +1,307 @@
+#!/usr/bin/python3
+# Local stand-in for the Weedmaps endpoints CanaData pulls from, so runs can be tested & timed without the network
+# Serves responses recorded with CanaData.py -record <folder>, or made up ones, with optional latency, page sizes & errors
+#
+# Usage: python3 CanaServer.py [-port 8000] [-recordings <folder>] [-synthetic <listings per slug>] [-items <avg items per menu>]
+#                              [-latency <seconds>] [-pagesize <most listings per page>] [-errors <fraction of requests>]
+#                              [-errorstatus 503] [-retryafter <seconds>] [-seed <number>] [-log]
+# Then point CanaData at it:
+#   python3 CanaData.py -baseurl http://127.0.0.1:8000/discovery/v1/listings -menuurl http://127.0.0.1:8000/api/web/v1/listings -go <slug>
+from http.server import ThreadingHTTPServer
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from urllib.parse import parse_qs
+from os import path as ospath
+from os import listdir
+from threading import Lock
+from sys import argv
+import random
+import zlib
+import json
+import time
+
+
+# Holds the settings & the data we serve
+class CanaServer:
+    # Weights items get priced by (same as Weedmaps)
+    priceWeights = ('half_gram', 'gram', 'two_grams', 'eighth', 'quarter', 'half_ounce', 'ounce')
+    categories = ('Indica', 'Sativa', 'Hybrid', 'Concentrate', 'Edible', 'Pre-Roll', 'Topicals')
+    # Made up listings are spread over this area (south, west, north, east), about the size of Colorado
+    syntheticArea = (37.0, -109.05, 41.0, -102.05)
+    brands = ('Kiva', 'Stiiizy', 'Cookies', 'Raw Garden', 'Jeeter', 'Wyld', 'Select', None)
+
+    def __init__(self):
+        # Port we listen on
+        self.port = 8000
+        # Folder of recorded responses (None = make everything up)
+        self.recordings = None
+        # Listings per slug & about how many items per menu when making things up
+        self.syntheticListings = 250
+        self.syntheticItems = 40
+        # Seconds every response is held back (like a real network)
+        self.latency = 0.0
+        # Most listings sent back per page (None = whatever the request asked for)
+        self.pageSize = None
+        # Fraction of requests that fail, what they fail with & the Retry-After we send back with them
+        self.errorRate = 0.0
+        self.errorStatus = 503
+        self.retryAfter = 1
+        # Seed for the made up data & errors (same seed = same data every time)
+        self.seed = 420
+        self.errorRandom = random.Random(self.seed)
+        # Set to True to print every request
+        self.log = False
+        # Recorded listings for each slug (slug -> (total, listings)) so we only read them once
+        self.recordedListings = {}
+        self.lock = Lock()
+
+    # Every listing for a slug, either from the recordings or made up
+    # Returns (total listings, list of listings) or None if we don't have the slug
+    def listingsFor(self, slug, storefronts, deliveries):
+        if self.recordings is not None:
+            return self.recordedListingsFor(slug)
+
+        listings = [self.syntheticListing(slug, number) for number in range(self.syntheticListings)]
+        # Only the types that were asked for (asking for neither gets both)
+        if storefronts != deliveries:
+            listings = [listing for listing in listings if (listing['type'] == 'dispensary') == storefronts]
+        return len(listings), listings
+
+    # Glues a slug's recorded pages back together so they can be served with any page size
+    def recordedListingsFor(self, slug):
+        with self.lock:
+            if slug in self.recordedListings:
+                return self.recordedListings[slug]
+
+            folder = f'{self.recordings}/{slug}'
+            if not ospath.isdir(folder):
+                return None
+
+            # Pages are saved as listings_<offset>.json
+            pages = []
+            for page_file in listdir(folder):
+                if page_file.startswith('listings_') and page_file.endswith('.json'):
+                    pages.append((int(page_file[len('listings_'):-len('.json')]), page_file))
+
+            total = 0
+            listings = []
+            for offset, page_file in sorted(pages):
+                with open(f'{folder}/{page_file}', encoding='utf-8') as infile:
+                    page = json.load(infile)
+                total = page['meta']['total_listings']
+                listings.extend(page['data']['listings'])
+
+            self.recordedListings[slug] = (total, listings)
+            return self.recordedListings[slug]
+
+    # A page of listings the way Weedmaps sends them (status, body)
+    def listingsPage(self, query):
+        # The slug is in the region filter for whichever types were asked for
+        services = query.get('filter[any_retailer_services][]', [])
+        slug = (query.get('filter[region_slug[dispensaries]]') or query.get('filter[region_slug[deliveries]]') or [None])[0]
+        if slug is None:
+            return 422, {'errors': [{'title': 'A region slug filter is required'}]}
+
+        found = self.listingsFor(slug, 'storefront' in services, 'delivery' in services)
+        if found is None:
+            return 200, {'meta': {'total_listings': 0}, 'data': {'listings': []}}
+        total, listings = found
+
+        # Only listings inside the bounding box (south,west,north,east) when there is one
+        if 'filter[bounding_box]' in query:
+            south, west, north, east = [float(value) for value in query['filter[bounding_box]'][0].split(',')]
+            listings = [listing for listing in listings if 'latitude' in listing and south <= listing['latitude'] <= north and west <= listing['longitude'] <= east]
+            total = len(listings)
+
+        offset = int(query.get('offset', ['0'])[0])
+        page_size = int(query.get('page_size', ['100'])[0])
+        if self.pageSize is not None:
+            page_size = min(page_size, self.pageSize)
+
+        # Asking past the end is what Weedmaps answers with a 422
+        if offset > 0 and offset >= len(listings):
+            return 422, {'errors': [{'title': 'Offset is past the last listing'}]}
+
+        return 200, {'meta': {'total_listings': total}, 'data': {'listings': listings[offset:offset + page_size]}}
+
+    # A listing's menu (status, body), recorded menus are sent back exactly as they were saved
+    def menu(self, slug):
+        if self.recordings is not None:
+            menu_file = f'{self.recordings}/menus/{slug}.json'
+            if not ospath.exists(menu_file):
+                return 404, {'errors': [{'title': 'No recorded menu for this listing'}]}
+            with open(menu_file, 'rb') as infile:
+                return 200, infile.read()
+
+        return 200, self.syntheticMenu(slug)
+
+    # A made up listing (the same slug & number always gives the same listing)
+    def syntheticListing(self, slug, number):
+        listing_slug = f'{slug}-shop-{str(number)}'
+        rand = random.Random(f'{str(self.seed)}:{listing_slug}:location')
+        south, west, north, east = self.syntheticArea
+        return {
+            'id': self.syntheticId(listing_slug),
+            'wmid': self.syntheticId(listing_slug) + 1000000,
+            'slug': listing_slug,
+            'name': f'Shop {str(number)}',
+            'type': 'delivery' if number % 3 == 0 else 'dispensary',
+            'latitude': round(rand.uniform(south, north), 6),
+            'longitude': round(rand.uniform(west, east), 6),
+        }
+
+    # A made up menu for a listing (the same listing always gets the same menu)
+    # Delivery services carry the same menu as the storefront listed after them (like a chain's delivery & storefront), only every
+    # listing's menu gives its items their own ids & dates, just like Weedmaps
+    def syntheticMenu(self, listing_slug):
+        rand = random.Random(f'{str(self.seed)}:{listing_slug}')
+        number = int(listing_slug.rsplit('-', 1)[-1]) if listing_slug.rsplit('-', 1)[-1].isdigit() else 0
+        listing = {
+            'id': self.syntheticId(listing_slug),
+            'wmid': self.syntheticId(listing_slug) + 1000000,
+            'slug': listing_slug,
+            'name': f'Shop {str(number)}',
+            '_type': 'delivery' if number % 3 == 0 else 'dispensary',
+            'city': 'Testville',
+            'rating': round(rand.uniform(3, 5), 1),
+        }
+
+        # Items are made up from the menu's own seed, ids & dates from the listing's
+        menu_slug = f'{listing_slug.rsplit("-", 1)[0]}-{str(number + 1)}' if listing['_type'] == 'delivery' and listing_slug.rsplit('-', 1)[-1].isdigit() else listing_slug
+        rand = random.Random(f'{str(self.seed)}:{menu_slug}:menu')
+        ids = random.Random(f'{str(self.seed)}:{listing_slug}:ids')
+
+        # Some menus are empty, just like the real thing
+        item_count = rand.randint(0, self.syntheticItems * 2) if rand.random() > 0.1 else 0
+        categories = {}
+        for item_number in range(item_count):
+            category = rand.choice(self.categories)
+            brand = rand.choice(self.brands)
+            item = {
+                'id': ids.randint(1, 10 ** 7),
+                'name': f'{rand.choice(["Blue", "Sour", "OG", "Purple", "Lemon", "Gelato"])} {rand.choice(["Dream", "Diesel", "Kush", "Haze", "Cake"])} #{str(item_number)}',
+                'body': f'THC: {str(round(rand.uniform(12, 32), 1))}% CBD: {str(round(rand.uniform(0, 2), 1))}% {rand.choice(["Tasty", "Smooth", "Strong", "Fruity"])} {category.lower()}',
+                'prices': {weight: rand.choice([0, 0, rand.randint(5, 60) * (index + 1)]) for index, weight in enumerate(self.priceWeights)},
+                'category': {'name': category},
+                'image_url': f'https://images.example/{str(item_number)}.jpg',
+                'tags': rand.sample(['indoor', 'sungrown', 'organic', 'sale'], rand.randint(0, 2)),
+                'updated_at': f'2020-1{str(ids.randint(0, 2))}-1{str(ids.randint(0, 9))}T12:00:00Z',
+            }
+            if brand is not None:
+                item['brand'] = {'name': brand}
+            categories.setdefault(category, []).append(item)
+
+        return {'listing': listing, 'categories': [{'name': name, 'items': items} for name, items in categories.items()]}
+
+    # Stable made up id for a slug
+    def syntheticId(self, slug):
+        return zlib.crc32(f'{str(self.seed)}:{slug}'.encode('utf-8')) & 0x7fffffff
+
+    # Whether this request should fail (error injection)
+    def shouldFail(self):
+        if self.errorRate <= 0:
+            return False
+        with self.lock:
+            return self.errorRandom.random() < self.errorRate
+
+
+# Answers each request (one thread per request)
+class CanaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        cana = self.server.cana
+        url = urlparse(self.path)
+
+        # Act like a real network
+        if cana.latency > 0:
+            time.sleep(cana.latency)
+
+        if cana.shouldFail():
+            self.reply(cana.errorStatus, {'errors': [{'title': 'Injected error'}]}, {'Retry-After': str(cana.retryAfter)})
+            return
+
+        # /discovery/v1/listings?offset=...
+        if url.path.rstrip('/').endswith('/listings'):
+            status, body = cana.listingsPage(parse_qs(url.query))
+        # /api/web/v1/listings/<listing slug>/menu?type=...
+        elif url.path.rstrip('/').endswith('/menu'):
+            status, body = cana.menu(url.path.rstrip('/').split('/')[-2])
+        else:
+            status, body = 404, {'errors': [{'title': 'Not a Weedmaps endpoint we know'}]}
+
+        self.reply(status, body)
+
+    # Sends back a JSON body (bytes are sent as they are)
+    def reply(self, status, body, headers={}):
+        content = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.cana.log is True:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+# Starts serving until stopped (ctrl+c)
+def serve(cana):
+    server = ThreadingHTTPServer(('127.0.0.1', cana.port), CanaHandler)
+    server.daemon_threads = True
+    server.cana = cana
+
+    source = f'recordings in {cana.recordings}' if cana.recordings is not None else f'{str(cana.syntheticListings)} made up listings per slug'
+    print(f'Serving {source} on http://127.0.0.1:{str(cana.port)}')
+    print(f'Use: -baseurl http://127.0.0.1:{str(cana.port)}/discovery/v1/listings -menuurl http://127.0.0.1:{str(cana.port)}/api/web/v1/listings')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\nStopped!')
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    cana = CanaServer()
+
+    # Argument list
+    argList = list(argv)
+
+    if '-port' in argList:
+        cana.port = int(argList[argList.index('-port') + 1])
+
+    if '-recordings' in argList:
+        cana.recordings = argList[argList.index('-recordings') + 1]
+
+    if '-synthetic' in argList:
+        cana.syntheticListings = int(argList[argList.index('-synthetic') + 1])
+
+    if '-items' in argList:
+        cana.syntheticItems = int(argList[argList.index('-items') + 1])
+
+    if '-latency' in argList:
+        cana.latency = float(argList[argList.index('-latency') + 1])
+
+    if '-pagesize' in argList:
+        cana.pageSize = int(argList[argList.index('-pagesize') + 1])
+
+    if '-errors' in argList:
+        cana.errorRate = float(argList[argList.index('-errors') + 1])
+
+    if '-errorstatus' in argList:
+        cana.errorStatus = int(argList[argList.index('-errorstatus') + 1])
+
+    if '-retryafter' in argList:
+        cana.retryAfter = argList[argList.index('-retryafter') + 1]
+
+    if '-seed' in argList:
+        cana.seed = int(argList[argList.index('-seed') + 1])
+        cana.errorRandom = random.Random(cana.seed)
+
+    if '-log' in argList:
+        cana.log = True
+
+    serve(cana)
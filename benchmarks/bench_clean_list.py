@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+# Times organize_into_clean_list against the old list based key union on a synthetic dataset
+# Usage: python3 benchmarks/bench_clean_list.py [number of items (default 500000)] [items per listing (default 100)]
+from os import path as ospath
+from sys import argv
+from sys import path
+import random
+import time
+
+# CanaData lives one folder up
+path.append(ospath.dirname(ospath.dirname(ospath.abspath(__file__))))
+from CanaData import CanaData
+
+
+# Builds a Weedmaps shaped menu item, some keys only show up on some items (like the real thing)
+def synthetic_item(rand, item_id, listing_id, extras=12):
+    item = {
+        'id': item_id,
+        'name': f'Strain #{str(rand.randint(1, 5000))}',
+        'body': 'THC: ' + str(round(rand.uniform(10, 30), 2)) + '% tasty',
+        'prices': {'gram': rand.choice([0, 10, 12, 15]), 'two_grams': 0, 'eighth': rand.choice([0, 35, 40]), 'quarter': 0, 'half_ounce': 0, 'ounce': rand.choice([0, 150, 200]), 'half_gram': 0},
+        'category': {'name': rand.choice(['Indica', 'Sativa', 'Hybrid', 'Concentrate'])},
+        'image_url': f'https://images.example/{str(item_id)}.jpg',
+        'tags': [],
+    }
+    # Optional extras so the key union has work to do
+    for extra in range(rand.randint(0, extras)):
+        item[f'extra_{str(rand.randint(0, 40))}'] = {'value': rand.randint(0, 100), 'label': 'x'}
+    item['locations_found_at'] = [f'/dispensaries/listing-{str(listing_id)}']
+    item['listing_id'] = listing_id
+    item['listing_wmid'] = listing_id + 100000
+    return item
+
+
+# The column union the way it was done before (lists + "in" checks), kept here to measure against
+def legacy_fill_in_keys(flatDictList):
+    all_keys = []
+    ready_list = []
+    for item in flatDictList:
+        for key in item.keys():
+            if key not in all_keys:
+                all_keys.append(key)
+    for item in flatDictList:
+        flat_ordered_dict = {}
+        current_keys = list(item.keys())
+        for all_key in all_keys:
+            if all_key in current_keys:
+                flat_ordered_dict[all_key] = str(item[all_key])
+            else:
+                flat_ordered_dict[all_key] = 'None'
+        ready_list.append(flat_ordered_dict)
+    return ready_list
+
+
+if __name__ == '__main__':
+    itemCount = int(argv[1]) if len(argv) > 1 else 500000
+    perListing = int(argv[2]) if len(argv) > 2 else 100
+
+    rand = random.Random(420)
+    cana = CanaData()
+    for item_id in range(itemCount):
+        listing_id = item_id // perListing
+        cana.allMenuItems.setdefault(listing_id, []).append(synthetic_item(rand, item_id, listing_id))
+    print(f'Built {str(itemCount)} items over {str(len(cana.allMenuItems))} listings')
+
+    # Flattening is the same either way, so it's timed on its own
+    start = time.perf_counter()
+    flatDictList = [cana.flatten_dictionary(item) for listing in cana.allMenuItems for item in cana.allMenuItems[listing]]
+    print(f'Flatten: {time.perf_counter() - start:.2f}s')
+
+    start = time.perf_counter()
+    legacy = legacy_fill_in_keys(flatDictList)
+    legacy_seconds = time.perf_counter() - start
+    print(f'Old key union + fill: {legacy_seconds:.2f}s')
+
+    start = time.perf_counter()
+    ready_list = cana.fill_in_keys(flatDictList)
+    new_seconds = time.perf_counter() - start
+    print(f'fill_in_keys: {new_seconds:.2f}s')
+
+    # Same columns, same order, same values
+    same = len(legacy) == len(ready_list) and all(list(old.items()) == list(new.items()) for old, new in zip(legacy, ready_list))
+    print(f'Identical output: {str(same)}')
+    print(f'Speedup: {legacy_seconds / new_seconds:.1f}x')
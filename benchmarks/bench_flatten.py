@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+# Times flatten_fast against flatten_dictionary & checks they give back exactly the same thing
+# Usage: python3 benchmarks/bench_flatten.py [number of synthetic items (default 200000) or a <slug>_journal.jsonl left by a run that didn't finish to use real menus] [max optional keys per item (default both 0 & 3)]
+from os import path as ospath
+from sys import argv
+from sys import path
+import json
+import random
+import time
+
+# CanaData lives one folder up
+path.append(ospath.dirname(ospath.dirname(ospath.abspath(__file__))))
+from CanaData import CanaData
+from bench_clean_list import synthetic_item
+
+
+# Pulls every menu item out of a slug's journal (the menus exactly as Weedmaps sent them)
+def journal_items(journal_file):
+    items = []
+    with open(journal_file, encoding='utf-8') as infile:
+        for line in infile:
+            entry = json.loads(line)
+            if 'menu' in entry:
+                for category in entry['data']['categories']:
+                    items.extend(category['items'])
+    return items
+
+
+if __name__ == '__main__':
+    source = argv[1] if len(argv) > 1 else '200000'
+    # Real menus only have a handful of item shapes, optional keys give (nearly) every item its own shape
+    # With no number given both are timed, so shapes that never pay for compiling show up too
+    extras_cases = [int(argv[2])] if len(argv) > 2 else [0, 3]
+
+    for extras in extras_cases if not source.endswith('.jsonl') else [None]:
+        if extras is None:
+            items = journal_items(source)
+        else:
+            rand = random.Random(420)
+            items = [synthetic_item(rand, item_id, item_id // 100, extras) for item_id in range(int(source))]
+        print(f'\nFlattening {str(len(items))} items' + (f' (up to {str(extras)} optional keys)' if extras is not None else ''))
+
+        cana = CanaData()
+
+        start = time.perf_counter()
+        generic = [cana.flatten_dictionary(item) for item in items]
+        generic_seconds = time.perf_counter() - start
+        print(f'flatten_dictionary: {generic_seconds:.2f}s')
+
+        start = time.perf_counter()
+        fast = [cana.flatten_fast(item) for item in items]
+        fast_seconds = time.perf_counter() - start
+        compiled = sum(1 for flattener in cana.flatSchemas.values() if type(flattener) is not int)
+        print(f'flatten_fast: {fast_seconds:.2f}s ({str(len(cana.flatSchemas))} shapes, {str(compiled)} compiled)')
+
+        # Same keys, same order, same values
+        same = all(list(old.items()) == list(new.items()) for old, new in zip(generic, fast))
+        print(f'Identical output: {str(same)}')
+        print(f'Speedup: {generic_seconds / fast_seconds:.1f}x')
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+# Times the hot paths of CanaData & CanaParse on made up (Weedmaps shaped) menus & saves the numbers to a JSON file
+# Every benchmark is run once for its time & once more under tracemalloc for its peak memory (-nomemory skips that, it's slow)
+# Usage: python3 benchmarks/bench_suite.py [-listings 200] [-items 100] [-depth 2] [-only flatten_dictionary,csv_maker] [-out benchmarks/bench_results.json] [-nomemory]
+from os import path as ospath
+from sys import argv
+from sys import path
+from datetime import datetime
+import contextlib
+import tempfile
+import platform
+import tracemalloc
+import json
+import time
+import gc
+import io
+
+# CanaData lives one folder up & CanaParse in parse-script
+repo_dir = ospath.dirname(ospath.dirname(ospath.abspath(__file__)))
+path.append(repo_dir)
+path.append(f'{repo_dir}/parse-script')
+from CanaData import CanaData
+import CanaParse
+from payloads import weedmaps_menus
+from payloads import chain_menu
+from bench_clean_list import synthetic_item
+import random
+
+
+# Runs a benchmark, setup gives back the arguments for run (and isn't timed)
+def measure(setup, run, items, memory=True):
+    # Quiet, both scripts print a lot
+    with contextlib.redirect_stdout(io.StringIO()):
+        args = setup()
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        seconds = time.perf_counter() - start
+
+        peak = None
+        if memory is True:
+            args = setup()
+            gc.collect()
+            tracemalloc.start()
+            run(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {
+        'seconds': round(seconds, 4),
+        'items': items,
+        'items_per_second': round(items / seconds, 1) if seconds > 0 else None,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2) if peak is not None else None,
+    }
+
+
+if __name__ == '__main__':
+    # Argument list
+    argList = list(argv)
+    listings = int(argList[argList.index('-listings') + 1]) if '-listings' in argList else 200
+    items = int(argList[argList.index('-items') + 1]) if '-items' in argList else 100
+    depth = int(argList[argList.index('-depth') + 1]) if '-depth' in argList else 2
+    only = argList[argList.index('-only') + 1].split(',') if '-only' in argList else None
+    memory = '-nomemory' not in argList
+    out_file = argList[argList.index('-out') + 1] if '-out' in argList else f'{repo_dir}/benchmarks/bench_results.json'
+
+    # CanaData writes its CSV's next to the script (path[0]), point that at a throwaway folder instead
+    output_dir = tempfile.TemporaryDirectory()
+    path[0] = output_dir.name
+
+    cana = CanaData()
+    cana.setCitySlug('bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for menu in weedmaps_menus(listings, items, depth):
+            cana.processMenu(menu)
+    all_items = [item for listing in cana.allMenuItems.values() for item in listing]
+    print(f'Made up {str(len(all_items))} items over {str(listings)} listings (depth {str(depth)})')
+
+    # Items with a few optional keys each (nearly every item its own shape), flatten_fast shouldn't lose to flatten_dictionary on these
+    varied_rand = random.Random(420)
+    varied_items = [synthetic_item(varied_rand, item_id, item_id // items, 3) for item_id in range(len(all_items))]
+
+    # Every listing again as a chain's delivery service (same items, their own ids), -dedup has to fold each copy into its storefront's row
+    chain = CanaData()
+    chain.setCitySlug('bench')
+    chain.dedupItems = True
+    chain_rand = random.Random(420)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for menu in weedmaps_menus(listings, items, depth):
+            delivery = chain_menu(chain_rand, menu, listings)
+            chain.processMenu(menu)
+            chain.processMenu(delivery)
+        chain.organize_into_clean_list()
+    merged = sum(1 for locations in chain.mergedLocations.values() if len(locations) == 2)
+    if chain.duplicatesDropped != len(all_items) or merged != len(all_items):
+        raise SystemExit(f'-dedup merged {str(chain.duplicatesDropped)} of {str(len(all_items))} chain items ({str(merged)} rows with both locations)')
+
+    # CanaParse works off the results CSV & the filters in flower-filters.json
+    with contextlib.redirect_stdout(io.StringIO()):
+        cana.organize_into_clean_list()
+        cana.csv_maker('bench_results', cana.finishedMenuItems)
+    results_csv = f'{cana.outputFolder()}/bench_results.csv'
+    flower_filters = CanaParse.load_filters(f'{repo_dir}/parse-script/flower-filters.json')
+    weighted_rows = CanaParse.load_weighted_rows(results_csv)
+    with contextlib.redirect_stdout(io.StringIO()):
+        filtered_tables = CanaParse.filter_rows(flower_filters, [row.copy() for row in weighted_rows])
+    filtered_rows = sum(len(table) for table in filtered_tables)
+
+    # Compiled flatteners are thrown out before each run so they get timed too
+    def flatten_setup():
+        cana.flatSchemas = {}
+        cana.flatKeys = {}
+        return ()
+
+    # Dedup starts over on every run
+    def dedupe_setup():
+        chain.flatSchemas = {}
+        chain.flatKeys = {}
+        chain.itemHashes = {}
+        chain.mergedLocations = {}
+        chain.duplicatesDropped = 0
+        return ()
+
+    # The html generators read the filters & their tables from CanaParse itself
+    def html_setup():
+        CanaParse.flower_filters = flower_filters
+        CanaParse.filtered_tables = filtered_tables
+        return ()
+
+    # The filters add to the rows they check, so every run gets fresh copies
+    def filter_setup():
+        return flower_filters, [row.copy() for row in weighted_rows]
+
+    # name -> (setup, run, number of items it works through)
+    benchmarks = {
+        'flatten_dictionary': (lambda: (), lambda: [cana.flatten_dictionary(item) for item in all_items], len(all_items)),
+        'flatten_fast': (flatten_setup, lambda: [cana.flatten_fast(item) for item in all_items], len(all_items)),
+        'flatten_dictionary_varied': (lambda: (), lambda: [cana.flatten_dictionary(item) for item in varied_items], len(varied_items)),
+        'flatten_fast_varied': (flatten_setup, lambda: [cana.flatten_fast(item) for item in varied_items], len(varied_items)),
+        'organize_into_clean_list': (flatten_setup, cana.organize_into_clean_list, len(all_items)),
+        'dedupe_items': (dedupe_setup, chain.organize_into_clean_list, len(all_items) * 2),
+        'csv_maker': (lambda: ('bench_results', cana.finishedMenuItems), cana.csv_maker, len(all_items)),
+        'load_weighted_rows': (lambda: (results_csv,), CanaParse.load_weighted_rows, len(all_items)),
+        'filter_rows': (filter_setup, CanaParse.filter_rows, len(weighted_rows) * len(flower_filters)),
+        'generate_html': (html_setup, CanaParse.generate_html, filtered_rows),
+        'generate_html_email': (html_setup, CanaParse.generate_html_email, filtered_rows),
+    }
+
+    results = {}
+    for name, (setup, run, count) in benchmarks.items():
+        if only is not None and name not in only:
+            continue
+        results[name] = measure(setup, run, count, memory)
+        memory_note = f', peak {results[name]["peak_memory_mb"]} MB' if memory is True else ''
+        print(f'{name}: {results[name]["seconds"]:.3f}s ({results[name]["items_per_second"]} items/s{memory_note})')
+
+    output_dir.cleanup()
+
+    # Machine readable so runs can be compared
+    report = {
+        'when': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'settings': {'listings': listings, 'items': items, 'depth': depth},
+        'results': results,
+    }
+    with open(out_file, 'w', encoding='utf-8') as outfile:
+        json.dump(report, outfile, indent=2)
+    print(f'Saved results -> {out_file}')
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# Makes up Weedmaps shaped menus (the same JSON the menu endpoint sends back) for the benchmarks
+# Items are laid out so their flattened columns land where CanaParse looks for them (prices at 9-15, image at 17, category at 20, ...)
+import random
+
+strains = ('Blue Dream', 'Sour Diesel', 'OG Kush', 'Purple Punch', 'Lemon Haze', 'Gelato', 'Wedding Cake', 'Gorilla Glue', 'Zkittlez', 'Runtz')
+categories = ('Indica', 'Sativa', 'Hybrid', 'Concentrate', 'Edible', 'Pre-Roll', 'Topicals')
+brands = ('Kiva', 'Stiiizy', 'Cookies', 'Raw Garden', 'Jeeter', 'Wyld', 'Select', 'House')
+# Words the filters in flower-filters.json look for (good, bad & priority words)
+words = ('vape', 'cart', 'distillate', 'shatter', 'wax', 'badder', 'shake', 'popcorn', 'special', 'deal', 'fresh', 'sticky', 'smooth', 'tasty', 'indoor', 'sungrown')
+terpenes = ('Myrcene', 'Limonene', 'B-Caryophyllene', 'Pinene')
+
+
+# A single menu item, depth is how many levels of nested metadata it carries (on top of the usual prices/category/brand)
+def weedmaps_item(rand, item_id, listing, depth):
+    category = rand.choice(categories)
+    strain = rand.choice(strains)
+    thc = round(rand.uniform(10, 35) if category != 'Concentrate' else rand.uniform(60, 95), 1)
+    cbd = round(rand.uniform(0, 2), 2)
+
+    # Description with the cannabinoid & terpene numbers CanaParse digs out of the text
+    body = f'THC: {str(thc)}% CBD: {str(cbd)}%'
+    for terpene in rand.sample(terpenes, rand.randint(0, 3)):
+        body += f' {terpene}: {str(round(rand.uniform(0.05, 2), 2))}%'
+    body += ' ' + ' '.join(rand.sample(words, rand.randint(1, 4)))
+
+    item = {
+        'id': item_id,
+        'body': body,
+        'name': f'{strain} {category}',
+        'slug': f'{strain.lower().replace(" ", "-")}-{str(item_id)}',
+        'license_type': rand.choice(['medical', 'recreational']),
+        'genetics': rand.choice(['indica', 'sativa', 'hybrid']),
+        'is_badged': rand.random() < 0.1,
+        'is_online_orderable': rand.random() < 0.5,
+        'price_unit': 'gram',
+        # Not every weight is sold (0 = not sold)
+        'prices': {
+            'gram': rand.choice([0, rand.randint(5, 60)]),
+            'two_grams': rand.choice([0, 0, rand.randint(15, 100)]),
+            'eighth': rand.choice([0, rand.randint(20, 60)]),
+            'quarter': rand.choice([0, rand.randint(40, 110)]),
+            'half_ounce': rand.choice([0, rand.randint(70, 200)]),
+            'ounce': rand.choice([0, rand.randint(100, 350)]),
+            'half_gram': rand.choice([0, 0, rand.randint(10, 45)]),
+        },
+        'avatar_image': {
+            'small_url': f'https://images.example/small/{str(item_id)}.jpg',
+            'original_url': f'https://images.example/{str(item_id)}.jpg',
+        },
+        'category': {'id': categories.index(category) + 1, 'slug': category.lower(), 'name': category},
+        'brand': {'id': rand.randint(1, 500), 'name': rand.choice(brands)},
+        'strain_type': rand.choice(['indica', 'sativa', 'hybrid']),
+        'created_at': f'2020-0{str(rand.randint(1, 9))}-1{str(rand.randint(0, 9))}T12:00:00Z',
+        'updated_at': f'2020-1{str(rand.randint(0, 2))}-1{str(rand.randint(0, 9))}T12:00:00Z',
+        'published': True,
+        'listing_type': listing['_type'],
+        'listing_path': f'/{"deliveries" if listing["_type"] == "delivery" else "dispensaries"}/{listing["slug"]}#menu',
+        'listing_name': listing['name'],
+        'city': listing['city'],
+        'state': 'Colorado',
+        'rating': round(rand.uniform(3, 5), 1),
+        'reviews_count': rand.randint(0, 900),
+        'cbd_percentage': str(cbd),
+        'thc_label': 'percent',
+        'thc_percentage': str(thc),
+    }
+
+    # Nested metadata, each level holds a couple of values & the next level
+    if depth > 0:
+        level = item['metadata'] = {}
+        for number in range(1, depth + 1):
+            level['value'] = rand.randint(0, 1000)
+            level['label'] = rand.choice(words)
+            if number < depth:
+                level = level[f'level_{str(number + 1)}'] = {}
+
+    return item
+
+
+# A listing's whole menu (listing info + items split up by category)
+def weedmaps_menu(rand, listing_number, items, depth):
+    listing_type = 'delivery' if listing_number % 3 == 0 else 'dispensary'
+    listing = {
+        'id': listing_number + 1,
+        'wmid': listing_number + 100001,
+        'slug': f'bench-shop-{str(listing_number)}',
+        'name': f'Bench Shop {str(listing_number)}',
+        '_type': listing_type,
+        'city': rand.choice(['Denver', 'Boulder', 'Aurora', 'Pueblo']),
+        'rating': round(rand.uniform(3, 5), 1),
+    }
+
+    menu_categories = {}
+    for number in range(items):
+        item = weedmaps_item(rand, listing_number * items + number + 1, listing, depth)
+        menu_categories.setdefault(item['category']['name'], []).append(item)
+
+    return {'listing': listing, 'categories': [{'name': name, 'items': menu_items} for name, menu_items in menu_categories.items()]}
+
+
+# Every listing's menu, the same seed always gives back the same menus
+def weedmaps_menus(listings, items, depth, seed=420):
+    rand = random.Random(seed)
+    for listing_number in range(listings):
+        yield weedmaps_menu(rand, listing_number, items, depth)
+
+
+# The same menu carried by another listing (like a chain's delivery service carrying its storefront's menu)
+# The items are the same products, only every listing's menu gives them their own ids, slugs & dates
+def chain_menu(rand, menu, listings):
+    storefront = menu['listing']
+    listing = dict(storefront, id=storefront['id'] + listings, wmid=storefront['wmid'] + listings, slug=f'{storefront["slug"]}-delivery', name=f'{storefront["name"]} Delivery', _type='delivery')
+
+    menu_categories = []
+    for category in menu['categories']:
+        menu_items = []
+        for item in category['items']:
+            item_id = rand.randint(10 ** 7, 10 ** 8)
+            menu_items.append(dict(item, id=item_id, slug=f'{item["slug"].rsplit("-", 1)[0]}-{str(item_id)}',
+                                   created_at=f'2021-0{str(rand.randint(1, 9))}-1{str(rand.randint(0, 9))}T12:00:00Z',
+                                   updated_at=f'2021-1{str(rand.randint(0, 2))}-1{str(rand.randint(0, 9))}T12:00:00Z',
+                                   listing_type='delivery', listing_path=f'/deliveries/{listing["slug"]}#menu', listing_name=listing['name']))
+        menu_categories.append({'name': category['name'], 'items': menu_items})
+
+    return {'listing': listing, 'categories': menu_categories}
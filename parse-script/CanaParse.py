@@ -5,7 +5,25 @@ from yattag import Doc
 from yattag import indent
 import re
 import json
+import time
 from operator import itemgetter
+from itertools import compress
+
+#numpy is optional, when it's installed the price, category & THC/CBD floor checks are run over whole columns at once
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#pyahocorasick is optional, when it's installed every word list is checked in one pass over a row's text (however many words there are)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+#CanaMetrics lives next to CanaData.py, one folder up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from CanaMetrics import CanaMetrics
 
 class FlowerFilter(object):
      pass
@@ -30,39 +48,52 @@ csv_file = "colorado_results.csv"
 #csv_file = "nevada_results.csv"
 
 flower_filters = []
-with open('./flower-filters.json') as json_file:
-    data = json.load(json_file)
-    for filter in data['filters']:
-        flower_filter = FlowerFilter()
-        flower_filter.table_sort_col = str(filter["table_sort_col"]) #used for view
-        flower_filter.limit_results_amt = int(filter["limit_results_amt"]) #used for view
-        flower_filter.limit_results_amt_email = int(filter["limit_results_amt_email"]) #used for view
-        flower_filter.name = str(filter["name"]) #used for view
-        flower_filter.key = str(filter["key"]) #most important var
-        flower_filter.compare = str(filter["compare"]) #disregards zero amts
-        flower_filter.price = float(filter["price"]) #float max price
-        flower_filter.categories = filter["categories"]
-        flower_filter.brands = filter["brands"]
-        flower_filter.stores = filter["stores"]
-        flower_filter.strains = filter["strains"]
-        flower_filter.bad_words = filter["bad_words"]
-        if 'good_words' in filter:
-            flower_filter.good_words = filter["good_words"]
-        flower_filter.priority_words = filter["priority_words"]
-        flower_filter.thc_floor = int(filter["thc_floor"]) #float experimental: scans all output for any percentagex and tries to figure out if it's THC. If set to 0 it will disregard filter. It will disregard all results that do not have THC info.
-        if 'cbd_floor' in filter:
-            flower_filter.cbd_floor = float(filter["cbd_floor"]) #float same as above
-        else:
-            flower_filter.cbd_floor = 0
-        flower_filter.thc_floor_strict = bool(filter["thc_floor_strict"]) #Allows items with no avail THC info
-        flower_filter.cbd_floor_strict = bool(filter["cbd_floor_strict"]) #Allows items with no avail THC info
 
-        if 'terpenes' in filter:
-            flower_filter.terpenes = filter["terpenes"]
-        else:
-            flower_filter.terpenes = []
+#timings for each step, saved to ./output/canaparse_metrics.json
+metrics = CanaMetrics('canaparse')
+#set to True to skip the per-row prints
+quiet = False
+#set to False to check every row in plain Python even with numpy installed
+use_numpy = True
+
+#reads the filters to run from flower-filters.json
+def load_filters(filters_file='./flower-filters.json'):
+    flower_filters = []
+    with open(filters_file) as json_file:
+        data = json.load(json_file)
+        for filter in data['filters']:
+            flower_filter = FlowerFilter()
+            flower_filter.table_sort_col = str(filter["table_sort_col"]) #used for view
+            flower_filter.limit_results_amt = int(filter["limit_results_amt"]) #used for view
+            flower_filter.limit_results_amt_email = int(filter["limit_results_amt_email"]) #used for view
+            flower_filter.name = str(filter["name"]) #used for view
+            flower_filter.key = str(filter["key"]) #most important var
+            flower_filter.compare = str(filter["compare"]) #disregards zero amts
+            flower_filter.price = float(filter["price"]) #float max price
+            flower_filter.categories = filter["categories"]
+            flower_filter.brands = filter["brands"]
+            flower_filter.stores = filter["stores"]
+            flower_filter.strains = filter["strains"]
+            flower_filter.bad_words = filter["bad_words"]
+            if 'good_words' in filter:
+                flower_filter.good_words = filter["good_words"]
+            flower_filter.priority_words = filter["priority_words"]
+            flower_filter.thc_floor = int(filter["thc_floor"]) #float experimental: scans all output for any percentagex and tries to figure out if it's THC. If set to 0 it will disregard filter. It will disregard all results that do not have THC info.
+            if 'cbd_floor' in filter:
+                flower_filter.cbd_floor = float(filter["cbd_floor"]) #float same as above
+            else:
+                flower_filter.cbd_floor = 0
+            flower_filter.thc_floor_strict = bool(filter["thc_floor_strict"]) #Allows items with no avail THC info
+            flower_filter.cbd_floor_strict = bool(filter["cbd_floor_strict"]) #Allows items with no avail THC info
+
+            if 'terpenes' in filter:
+                flower_filter.terpenes = filter["terpenes"]
+            else:
+                flower_filter.terpenes = []
+
+            flower_filters.append(flower_filter)
+    return flower_filters
 
-        flower_filters.append(flower_filter)
 ### non editable ###
 
 def getComparisonVal(op,val1,val2):
@@ -94,19 +125,167 @@ def getComparisonVal(op,val1,val2):
     else:
         return 0
 
+#prices.* keys in the order an Item's prices are in
+weights = [gram, two_grams, eighth, quarter, half_ounce, ounce, half_gram]
+
+#the other columns CanaParse reads (Item field -> name of the column in the results csv header)
+item_columns = {
+    'id': 'id',
+    'body': 'body',
+    'name': 'name',
+    'image': 'avatar_image.original_url',
+    'category': 'category.name',
+    'path': 'listing_path',
+    'dispensary': 'listing_name',
+    'thc_percentage': 'thc_percentage',
+}
+#item_columns the html can do without (the rest the filters need, so a header missing one of them stops us)
+optional_columns = ('id', 'image', 'thc_percentage')
+
+#one row of the results csv, read once
+#cells is the whole row & text all of it joined & lower cased (the word checks look at every cell), joined is the cells
+#run together & lower cased (what priority words are looked for in, made the first time it's asked for),
+#prices are floats in weights order (nan when the cell isn't a number), the item_columns are fields
+#& thc, cbd & terpenes (lower case name -> %) are what the row says about them (None when it doesn't)
+class Item(object):
+    __slots__ = ('cells', 'text', 'joined', 'prices', 'thc', 'cbd', 'terpenes') + tuple(item_columns)
+
+    #the cells run together & lower cased, made once for every filter & page that asks
+    def joined_text(self):
+        if self.joined is None:
+            self.joined = "".join(self.cells).lower()
+        return self.joined
+
+    #price for a prices.* key (gram when it isn't one)
+    def price(self, key):
+        return self.prices[weights.index(key) if key in weights else 0]
+
+    #THC or CBD % (kind 'thc' / 'cbd') or the named terpene's (kind 'terpene')
+    def amount(self, kind, name):
+        if kind == 'terpene':
+            return self.terpenes.get(name)
+        return getattr(self, kind)
+
+    #same item with its own terpenes, so reading more of them doesn't touch this one
+    def copy(self):
+        item = Item()
+        for field in self.__slots__:
+            setattr(item, field, getattr(self, field))
+        item.terpenes = dict(self.terpenes)
+        return item
+
+#cell i of the row ('None' like CanaData fills in, when the column isn't there)
+def cell_at(cells, i):
+    if i is None or i >= len(cells):
+        return 'None'
+    return cells[i]
+
+def as_price(cell):
+    try:
+        return float(cell)
+    except ValueError:
+        return float('nan')
+
+#true if at least one of the prices.* cells is a price
+def has_weight(price_cells):
+    return any(cell.replace('.','',1).isdigit() and float(cell) > 0 for cell in price_cells)
+
+#stops with a clear message when the header is missing columns the filters need (and warns about the ones the html uses)
+#otherwise every row would quietly read 'None' for them and the filters would come back empty
+def check_columns(header, source):
+    missing = [column for field, column in item_columns.items() if column not in header and field not in optional_columns]
+    if not any(weight in header for weight in weights):
+        missing += weights
+    if len(missing) > 0:
+        sys.exit("Error: " + source + " is missing the column(s) " + ", ".join(missing) + " (is it a CanaData results csv? the header may have changed)")
+    for field in optional_columns:
+        if item_columns[field] not in header:
+            print("Warning: " + source + " has no " + item_columns[field] + " column, it will show up as None")
+
+#finds the columns in the header once, gives back what turns a row into an Item (None when it has no price for any weight)
+def item_reader(header, source="the results csv"):
+    check_columns(header, source)
+    positions = {}
+    for i, column in enumerate(header):
+        positions.setdefault(column, i)
+    price_at = [positions.get(weight) for weight in weights]
+    field_at = [(field, positions.get(column)) for field, column in item_columns.items()]
+    #rows with every column go through itemgetter, short rows (or a header missing one) cell by cell
+    at = price_at + [i for field, i in field_at]
+    full = len(header) if None not in at else None
+    cells_for = itemgetter(*at) if full is not None else None
+
+    def read_item(cells):
+        if full is not None and len(cells) >= full:
+            found = cells_for(cells)
+        else:
+            found = [cell_at(cells, i) for i in at]
+        price_cells = found[:len(weights)]
+        if not has_weight(price_cells):
+            return None
+        item = Item()
+        item.cells = cells
+        item.text = " ".join(cells).lower()
+        item.joined = None
+        item.prices = tuple(as_price(cell) for cell in price_cells)
+        for (field, i), cell in zip(field_at, found[len(weights):]):
+            setattr(item, field, cell)
+        item.thc, item.cbd = read_cannabinoids(cells, item.text)
+        #terpenes are read once a filter asks for them
+        item.terpenes = {}
+        return item
+    return read_item
+
+#items of the results csv that have a price for at least one weight
 hasWeightArr = []
-with open(csv_folder+"/"+csv_file, encoding="utf8") as csvDataFile:
-    csvReader = csv.reader(csvDataFile)
-
-    for row in csvReader:
-        if(row[9].replace('.','',1).isdigit() and float(row[9]) > 0  \
-        or row[10].replace('.','',1).isdigit() and float(row[10]) > 0 \
-        or row[11].replace('.','',1).isdigit() and float(row[11]) > 0 \
-        or row[12].replace('.','',1).isdigit() and float(row[12]) > 0 \
-        or row[13].replace('.','',1).isdigit() and float(row[13]) > 0 \
-        or row[14].replace('.','',1).isdigit() and float(row[14]) > 0 \
-        or row[15].replace('.','',1).isdigit() and float(row[15]) > 0):
-            hasWeightArr.append(row)
+def load_weighted_rows(csv_path):
+    hasWeightArr = []
+    with open(csv_path, encoding="utf8") as csvDataFile, metrics.phase('load_rows'):
+        csvReader = csv.reader(csvDataFile)
+        read_item = item_reader(next(csvReader, []), csv_path)
+
+        for row in csvReader:
+            item = read_item(row)
+            if item is not None:
+                hasWeightArr.append(item)
+    metrics.addItems('load_rows', len(hasWeightArr))
+    return hasWeightArr
+
+#same as load_weighted_rows but straight from the flat items CanaData.iterSlug gives back (no csv in between)
+#items are laid out in the same columns the results csv would have (every key in the order it was first seen, 'None' where missing)
+def load_weighted_items(items):
+    hasWeightArr = []
+    with metrics.phase('load_rows'):
+        items = list(items)
+        keys = {}
+        for item in items:
+            keys.update(dict.fromkeys(item))
+        #nothing scraped means nothing to check the columns of
+        if len(items) == 0:
+            return hasWeightArr
+        read_item = item_reader(list(keys), "the scraped items")
+
+        for item in items:
+            item = read_item([item.get(key, 'None') for key in keys])
+            if item is not None:
+                hasWeightArr.append(item)
+    metrics.addItems('load_rows', len(hasWeightArr))
+    return hasWeightArr
+
+#runs CanaData for the slug right here and gives back its flat items (nothing is written out but the response cache)
+#the scrape's own metrics (locations & menus timings, requests, failures, bytes, latency) go in ./output/canadata_<slug>_metrics.json (& <prom_folder>/canadata_<slug>.prom)
+def scrape_items(slug, workers=1, prom_folder=None):
+    from CanaData import CanaData
+    cana = CanaData()
+    cana.quiet = quiet
+    #the cache goes next to CanaData.py (same as running CanaData.py), not in parse-script
+    cana.setDataFolder(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    cana.setMenuWorkers(workers)
+    items = [data for kind, data in cana.iterSlug(slug) if kind == 'item']
+    cana.metrics.writeJson("./output/canadata_" + slug + "_metrics.json")
+    if prom_folder is not None:
+        cana.metrics.writePrometheus(prom_folder + "/canadata_" + slug + ".prom")
+    return items
 
 class GetOutOfLoop( Exception ):
     pass
@@ -144,257 +323,357 @@ def extract_float_from_str(str):
 
     return ''.join(mgarr)
 
-filtered_tables = []
-for filter in flower_filters:
-    arr = hasWeightArr.copy()
-
-    intToUse = 9
-    if(filter.key == gram):
-        intToUse = 9
-    if(filter.key == two_grams):
-        intToUse = 10
-    if(filter.key == eighth):
-        intToUse = 11
-    if(filter.key == quarter):
-        intToUse = 12
-    if(filter.key == half_ounce):
-        intToUse = 13
-    if(filter.key == ounce):
-        intToUse = 14
-    if(filter.key == half_gram):
-        intToUse = 15
-
-    for row in hasWeightArr:
-
-        if(filter.price):
-            if(getComparisonVal(filter.compare,float(row[intToUse]),float(filter.price)) == 0):
-                try:
-                    arr.remove(row)
-                    continue
-                except:
-                    pass
-                continue
-
-        if(len(filter.categories)):
-            if(row[20].lower() not in str(filter.categories).lower()):
-                try:
-                    arr.remove(row)
-                    continue
-                except:
-                    pass
-                continue
-
-        if(len(filter.brands)):
-            res = [ele for ele in filter.brands if(ele.lower() in " ".join(row).lower())] 
-            if (bool(res) is False):
-                try:
-                    arr.remove(row)
-                    continue
-                except:
-                    pass
-                continue
-
-        if(len(filter.strains)):
-
-            res = [ele for ele in filter.strains if(ele.lower() in " ".join(row).lower())] 
-            if (bool(res) is False):
-                try:
-                    arr.remove(row)
-                    continue
-                except:
-                    pass
-                continue
-
-        if(len(filter.stores)):
-            res = [ele for ele in filter.stores if(ele.lower() in " ".join(row).lower())] 
-            if (bool(res) is False):
-                try:
-                    arr.remove(row)
-                    continue
-                except:
-                    pass
-                continue
+#getComparisonVal(op, val, price) as a single test, worked out once per filter
+def price_test(op, price):
+    if(op == '>='):
+        return lambda val: val >= price
+    if(op == '<='):
+        return lambda val: val > 0 and val <= price
+    if(op == '=='):
+        return lambda val: val == price
+    if(op == '>'):
+        return lambda val: val > price
+    if(op == '<'):
+        return lambda val: val > 0 and val < price
+    return lambda val: False
 
-        
-        if hasattr(filter, 'bad_words') and len(filter.bad_words):
-            breaker = False
-            for word in filter.bad_words:
-                for subrow in row:
-                    if(word.lower() in subrow.lower()):
-                        try:
-                            arr.remove(row)
-                            continue
-                        except:
-                            pass
-                        breaker = True 
-                        break
-                    else:
-
-                        continue
-                if breaker:
+#price_test for a whole column of prices at once (numpy array of True/False)
+def price_mask(op, price, values):
+    if(op == '>='):
+        return values >= price
+    if(op == '<='):
+        return (values > 0) & (values <= price)
+    if(op == '=='):
+        return values == price
+    if(op == '>'):
+        return values > price
+    if(op == '<'):
+        return (values > 0) & (values < price)
+    return numpy.zeros(len(values), dtype=bool)
+
+#a number the way the filters have always checked for one ("12.5" yes, "1.2.3" or "" no)
+def is_number(value):
+    return str(value).replace('.','',1).isdigit()
+
+#the first number in value, or value itself when there isn't one
+number_re = re.compile(r"[-+]?\d*\.\d+|\d+")
+def first_number(value):
+    found = number_re.findall(str(value))
+    if len(found) > 0:
+        return found[0]
+    return value
+
+#THC % in a cell that mentions thc (None if it can't be made out)
+def thc_value(cell):
+    result = 0
+    #If the first char is a digit, let's ussume it's THC
+    if(cell[0].isdigit()):
+        result = cell[0:7]
+    #THC:
+    if "THC:" in cell:
+        result = cell.split("THC:")[1][0:7]
+    result = first_number(result)
+    if is_number(result):
+        return str(result)
+    return None
+
+#CBD % in a cell that mentions cbd (always gives back something, 0 if it can't be made out)
+def cbd_value(cell):
+    result = 0
+    for found in (find_between(cell, "CBD: ", "%"), find_between(cell, "CBD - ", "%"), find_between(cell, ": ", "% CBD")):
+        if is_number(found):
+            result = found
+    head = cell.split('% CBD')[0]
+    if is_number(head[len(head)-4:]):
+        result = head[len(head)-4:]
+    if is_number(head):
+        result = head
+    return str(result)
+
+#% of the terpene (lower case name) in a cell that mentions it (None if it can't be made out)
+def terpene_value(cell, name):
+    result = 0
+    if is_number(find_between(cell, name+": ", "%")):
+        result = find_between(cell.lower(), name+": ", "%")
+
+    after = cell.lower().split(name)[1]
+    if(len(after)):
+        if(after[0] == ":" and len(after) > 1):
+            result = after[1]
+            if(after[1].isspace()):
+                result = after[2:7]
+            elif(after[1].isdigit()):
+                result = after[1:7]
+        elif(after[0].isspace() and len(after) > 1):
+            if(after[1] == "-"):
+                result = after[3:7]
+            elif(after[1].isdigit()):
+                result = after[1:7]
+        result = first_number(result)
+
+    if is_number(result):
+        return str(result)
+    return None
+
+#regex matching any of the words, laid out like a trie so every spot in a text is checked against all of them at once
+#where one word ends & a longer one keeps going, the longer one is tried first (so a match is the longest word starting there)
+def trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    return trie_node_pattern(trie)
+
+def trie_node_pattern(node):
+    branches = [re.escape(ch) + trie_node_pattern(child) for ch, child in node.items() if ch != '']
+    if len(branches) == 0:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        return '(?:' + pattern + ')?'
+    return pattern
+
+#finds which words are in a text (same as word in text for each of them)
+#words are added in groups (a filter's brands, bad words, ...), match() gives back every group with a word in the text
+class WordMatcher(object):
+    def __init__(self):
+        #word -> groups it's in
+        self.groups = {}
+        #aho-corasick automaton of the words (None when there aren't any), built on the first match after a word is added
+        self.automaton = None
+        #without pyahocorasick: trie regex giving the longest word at every spot in a text & word -> the words it starts with
+        self.pattern = None
+        self.prefixes = {}
+        self.built = False
+
+    def add(self, group, words):
+        for word in words:
+            self.groups.setdefault(word, []).append(group)
+        self.built = False
+        return group
+
+    def build(self):
+        self.automaton = None
+        self.pattern = None
+        words = [word for word in self.groups if word != '']
+        if len(words) and ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for word in words:
+                self.automaton.add_word(word, word)
+            self.automaton.make_automaton()
+        elif len(words):
+            #a lookahead so matches can overlap (a word inside another one, or starting inside one)
+            self.pattern = re.compile('(?=(' + trie_pattern(words) + '))')
+            self.prefixes = {word: [word[:end] for end in range(1, len(word) + 1) if word[:end] in self.groups] for word in words}
+        self.built = True
+
+    #the words that are in text, in one pass over it (aho-corasick with pyahocorasick, a trie regex without)
+    def words_in(self, text):
+        if not self.built:
+            self.build()
+        found = set()
+        if self.automaton is not None:
+            found = {word for end, word in self.automaton.iter(text)}
+        elif self.pattern is not None:
+            #every word found at a spot starts the longest one found there
+            for longest in set(self.pattern.findall(text)):
+                found.update(self.prefixes[longest])
+        #'' is in every text
+        if '' in self.groups:
+            found.add('')
+        return found
+
+    #groups with at least one of the words in found
+    def groups_in(self, found):
+        hits = set()
+        for word in found:
+            hits.update(self.groups[word])
+        return hits
+
+    def match(self, text):
+        return self.groups_in(self.words_in(text))
+
+#one matcher for every filter's priority words (each filter's group is its index in flower_filters)
+def priority_matcher():
+    matcher = WordMatcher()
+    for i, filter in enumerate(flower_filters):
+        matcher.add(i, [ele.lower() for ele in filter.priority_words])
+    return matcher
+
+#THC & CBD % of a row as floats (None when it doesn't say): the first cell mentioning thc that has a number & the first cell mentioning cbd
+def read_cannabinoids(cells, text):
+    thc = None
+    cbd = None
+    look_thc = 'thc' in text
+    look_cbd = 'cbd' in text
+    for cell in cells:
+        if not (look_thc or look_cbd):
+            break
+        lower = cell.lower()
+        if look_thc and 'thc' in lower:
+            thc = thc_value(cell)
+            look_thc = thc is None
+        if look_cbd and 'cbd' in lower:
+            cbd = cbd_value(cell)
+            look_cbd = False
+    return (float(thc) if thc is not None else None), (float(cbd) if cbd is not None else None)
+
+#% of each terpene (lower case names) in a row as floats (None when it doesn't say): the first cell mentioning it that has a number
+def read_terpenes(cells, text, names):
+    found = {}
+    for name in names:
+        found[name] = None
+        if name not in text:
+            continue
+        for cell in cells:
+            if name in cell.lower():
+                value = terpene_value(cell, name)
+                if value is not None:
+                    found[name] = float(value)
                     break
-
-
+    return found
+
+#the items as numpy columns (prices, categories, THC/CBD/terpene amounts & which rows mention a word)
+#each column is built the first time a filter needs it, so every filter after that checks all the rows at once
+class Columns(object):
+    def __init__(self, items):
+        self.items = items
+        #weight -> price of every item
+        self.price_columns = {}
+        #(kind, name) -> amount of every item (nan where it doesn't say)
+        self.amount_columns = {}
+        #word -> which items mention it
+        self.mention_columns = {}
+        #every lower case category & which of them each item is
+        self.category_names = None
+        self.category_column = None
+
+    #every item's price for the prices.* key
+    def prices(self, key):
+        weight = weights.index(key) if key in weights else 0
+        if weight not in self.price_columns:
+            self.price_columns[weight] = numpy.fromiter((item.prices[weight] for item in self.items), dtype=float, count=len(self.items))
+        return self.price_columns[weight]
+
+    #which items' category (lower case) is in categories, each different category is only checked once
+    def category_mask(self, categories):
+        if self.category_column is None:
+            self.category_names, self.category_column = numpy.unique(numpy.array([item.category.lower() for item in self.items], dtype=object), return_inverse=True)
+        keep = numpy.array([name in categories for name in self.category_names], dtype=bool)
+        return keep[self.category_column.reshape(-1)]
+
+    def amounts(self, kind, name):
+        if (kind, name) not in self.amount_columns:
+            amounts = (item.amount(kind, name) for item in self.items)
+            self.amount_columns[(kind, name)] = numpy.fromiter((numpy.nan if amount is None else amount for amount in amounts), dtype=float, count=len(self.items))
+        return self.amount_columns[(kind, name)]
+
+    def mentions(self, word):
+        if word not in self.mention_columns:
+            self.mention_columns[word] = numpy.fromiter((word in item.text for item in self.items), dtype=bool, count=len(self.items))
+        return self.mention_columns[word]
+
+#true if the amount is known and under the floor
+def under(amount, floor):
+    return amount is not None and amount < floor
+
+#one table of items per filter
+#each filter is worked out once (price test, lower case words, floors), the price, category & THC/CBD/terpene floor checks are run over
+#every item up front (a whole column at a time with numpy) & only the items still left go through the word checks one at a time
+filtered_tables = []
+def filter_rows(flower_filters, hasWeightArr):
+    filtered_tables = []
+
+    #terpenes any filter looks for, read out of every item once (an item keeps them, so they're not read again next time)
+    names = list(dict.fromkeys(terp["name"].lower() for filter in flower_filters for terp in filter.terpenes))
+    with metrics.phase('read_terpenes', len(hasWeightArr)):
+        for item in hasWeightArr:
+            missing = [name for name in names if name not in item.terpenes]
+            if len(missing):
+                item.terpenes.update(read_terpenes(item.cells, item.text, missing))
+
+    columns = Columns(hasWeightArr) if numpy is not None and use_numpy else None
+    #every filter's word lists go in one matcher up front, so each item's text is scanned once for all of them
+    #(an item needs one word from each of brands, strains & stores that has any, none of the bad words & one of the good words)
+    matcher = WordMatcher()
+    word_rules = []
+    for number, filter in enumerate(flower_filters):
+        required = [matcher.add((number, kind), [ele.lower() for ele in words]) for kind, words in (('brands', filter.brands), ('strains', filter.strains), ('stores', filter.stores)) if len(words)]
+        bad_words = [word.lower() for word in filter.bad_words] if hasattr(filter, 'bad_words') else []
+        bad_group = matcher.add((number, 'bad_words'), bad_words)
+        good_group = None
         if hasattr(filter, 'good_words') and len(filter.good_words):
-            if any(ext in " ".join(row).lower() for ext in filter.good_words):
-                pass
-            else:
-                print("removing non good_words item")
-                try:
-                    arr.remove(row)
-                    continue
-                except:
-                    pass
+            good_group = matcher.add((number, 'good_words'), filter.good_words)
+        word_rules.append((required, bad_words, bad_group, good_group))
+    #item -> (words in its text, groups they're in), found the first time a filter needs them
+    found_words = [None] * len(hasWeightArr)
 
-                    
+    for filter, (required, bad_words, bad_group, good_group) in zip(flower_filters, word_rules):
+        filter_start = time.perf_counter()
 
+        categories = str(filter.categories).lower()
+        #(kind, name, floor, strict): strict takes out items that don't mention it at all
+        floors = []
         if(filter.thc_floor > 0):
-            if("THC".lower() not in " ".join(row).lower()):
-                if(filter.thc_floor_strict):
-                    try:
-                        arr.remove(row)
-                        continue
-                    except:
-                        pass
-                else:
-                    pass
-            else:
-                for subrow in row:
-                    if('thc' in str(subrow).lower()):
-                        ind = subrow.lower().find('THC'.lower())
-                        result = 0
-
-                        #If the first char is a digit, let's ussume it's THC
-                        if(subrow[0].isdigit()):
-                            result = subrow[0:7]
-                        #THC:
-                        if "THC:" in subrow:
-                            result = subrow.split("THC:")[1][0:7]
-
-                        if len(re.findall(r"[-+]?\d*\.\d+|\d+", str(result) )) > 0:
-                            result = re.findall(r"[-+]?\d*\.\d+|\d+", str(result) )[0]
-                        
-                        if str(result).replace('.','',1).isdigit():
-                            if(float(result) < float(filter.thc_floor)):
-                                try:
-                                    arr.remove(row)
-                                    break
-                                except:
-                                    pass
-                                
-                                break
-                            else:
-                                strtoadd = str('thc'+"+"+str(result))
-                                row.append( strtoadd )
-                                break
-
+            floors.append(('thc', 'thc', float(filter.thc_floor), filter.thc_floor_strict))
         if(filter.cbd_floor > 0.001):
-            if("CBD".lower() not in " ".join(row).lower()):
-                if(filter.cbd_floor_strict):
-                    try:
-                        arr.remove(row)
-                        continue
-                    except:
-                        pass
-                else:
-                    pass
-            else:
-                for subrow in row:
-
-                    if('cbd' in str(subrow).lower()):
-                        ind = subrow.lower().find('CBD'.lower())
-                        result = 0
-                        if(find_between(subrow, "CBD: ", "%").replace('.','',1).isdigit()):
-                            result = find_between(subrow, "CBD: ", "%")
-                        if(find_between(subrow, "CBD - ", "%").replace('.','',1).isdigit()):
-                            result = find_between(subrow, "CBD - ", "%")
-                        if(find_between(subrow, ": ", "% CBD").replace('.','',1).isdigit()):
-                            result = find_between(subrow, ": ", "% CBD")
-                        if( subrow.split('% CBD')[0][len(subrow.split('% CBD')[0])-4:len(subrow.split('% CBD')[0])].replace('.','',1).isdigit() ):
-                            result = subrow.split('% CBD')[0][len(subrow.split('% CBD')[0])-4:len(subrow.split('% CBD')[0])]
-                            
-                        if( subrow.split('% CBD')[0].replace('.','',1).isdigit() ):
-                            result = subrow.split('% CBD')[0]
-                            
-                        if(float(result) < filter.cbd_floor):
-                            try:
-                                arr.remove(row)
-                                break
-                            except:
-                                pass
-                            
-                            break
-                        else:
-                            strtoadd = str("cbd"+"+"+str(result))
-                            row.append(str(strtoadd))
-                            break
-        if(len(filter.terpenes)):
-            for terp in filter.terpenes:
-                if(str(terp["name"].lower()) not in " ".join(row).lower()):
-                    if(terp["floor_strict"]):
-                        try:
-                            arr.remove(row)
-                            continue
-                        except:
-                            pass
-                    else:
-                        pass
-                else:
-                    for subrow in row:
-
-                        if(terp["name"].lower() in str(subrow).lower()):
-                            ind = subrow.lower().find(terp["name"].lower())
-                            result = 0
-                            if(find_between(subrow, terp["name"].lower()+": ", "%").replace('.','',1).isdigit()):
-                                result = find_between(subrow.lower(), terp["name"].lower()+": ", "%")
-
-                            if(len(subrow.lower().split(terp["name"].lower())[1])):
-                                if(subrow.lower().split(terp["name"].lower())[1][0] == ":"):
-                                    result = subrow.lower().split(terp["name"].lower())[1][1]
-
-                                    if(subrow.lower().split(terp["name"].lower())[1][1].isspace()):
-
-                                        result = subrow.lower().split(terp["name"].lower())[1][2:7]
-
-                                    elif( (subrow.lower().split(terp["name"].lower())[1][1]).isdigit() ):
-
-                                        result = subrow.lower().split(terp["name"].lower())[1][1:7]
-                                        pass
-                                
-                                    
-                                elif(subrow.lower().split(terp["name"].lower())[1][0].isspace() \
-                                    and len(subrow.lower().split(terp["name"].lower())[1]) > 1 ):
-                                    if(subrow.lower().split(terp["name"].lower())[1][1] == "-"):
-                                        result = subrow.lower().split(terp["name"].lower())[1][3:7]
-                                    elif(subrow.lower().split(terp["name"].lower())[1][1].isdigit()):
-                                        result = subrow.lower().split(terp["name"].lower())[1][1:7]
-
-                                if len(re.findall(r"[-+]?\d*\.\d+|\d+", str(result) )) > 0:
-                                    result = re.findall(r"[-+]?\d*\.\d+|\d+", str(result) )[0]
-
-                            if str(result).replace('.','',1).isdigit():
-                                if(float(result) < float(terp["floor"])):
-                                    try:
-                                        arr.remove(row)
-                                        break
-                                    except:
-                                        pass
-                                    
-                                    break
-                                else:
-                                    strtoadd = str(terp["name"].lower()+"+"+str(result))
+            floors.append(('cbd', 'cbd', filter.cbd_floor, filter.cbd_floor_strict))
+        for terp in filter.terpenes:
+            floors.append(('terpene', terp["name"].lower(), float(terp["floor"]), terp["floor_strict"]))
+
+        if columns is not None:
+            passed = numpy.ones(len(hasWeightArr), dtype=bool)
+            if(filter.price):
+                passed &= price_mask(filter.compare, float(filter.price), columns.prices(filter.key))
+            if(len(filter.categories)):
+                passed &= columns.category_mask(categories)
+            for kind, name, floor, strict in floors:
+                if(strict):
+                    passed &= columns.mentions(name)
+                passed &= ~(columns.amounts(kind, name) < floor)
+            passed = passed.tolist()
+        else:
+            passed = [True] * len(hasWeightArr)
+            if(filter.price):
+                price_ok = price_test(filter.compare, float(filter.price))
+                passed = [price_ok(item.price(filter.key)) for item in hasWeightArr]
+            if(len(filter.categories)):
+                passed = [keep and item.category.lower() in categories for keep, item in zip(passed, hasWeightArr)]
+            for kind, name, floor, strict in floors:
+                passed = [keep and (not strict or name in item.text) and not under(item.amount(kind, name), floor) for keep, item in zip(passed, hasWeightArr)]
+
+        for i in list(compress(range(len(hasWeightArr)), passed)):
+            item = hasWeightArr[i]
+            if found_words[i] is None:
+                found = matcher.words_in(item.text)
+                found_words[i] = (found, matcher.groups_in(found))
+            found, hits = found_words[i]
+
+            if any(group not in hits for group in required):
+                passed[i] = False
+                continue
+
+            #a bad word has to be inside a single cell
+            if bad_group in hits and any(word in found and any(word in cell.lower() for cell in item.cells) for word in bad_words):
+                passed[i] = False
+                continue
 
-                                    row.append( strtoadd )
+            if good_group is not None and good_group not in hits:
+                if not quiet:
+                    print("removing non good_words item")
+                passed[i] = False
 
-                                    break
+        arr = [item for item, keep in zip(hasWeightArr, passed) if keep]
+        if(filter.limit_results_amt > -1 and len(arr) > filter.limit_results_amt):
 
-                                
-    if(filter.limit_results_amt > -1 and len(arr) > filter.limit_results_amt):
-        
-        #sorting by price before snipping
-        arr = sorted(arr, key=lambda x: (x[1]))
-        arr = arr[-filter.limit_results_amt:]
-    filtered_tables.append(arr)
+            #sorting by price before snipping
+            arr = sorted(arr, key=lambda x: (x.body))
+            arr = arr[-filter.limit_results_amt:]
+        filtered_tables.append(arr)
+        metrics.addPhase('filter:' + filter.name, time.perf_counter() - filter_start, len(hasWeightArr))
+    return filtered_tables
 
 csvfile = "./output/filtered.csv"
 
@@ -402,22 +681,6 @@ csvfile = "./output/filtered.csv"
 #    writer = csv.writer(output, lineterminator='\n')
 #    writer.writerows(filteredItemsArr)  
 
-def translate_amnt_to_col(amnt):
-    if(amnt == gram):
-        return 9
-    if(amnt == two_grams):
-        return 10
-    if(amnt == eighth):
-        return 11
-    if(amnt == quarter):
-        return 12
-    if(amnt == half_ounce):
-        return 13
-    if(amnt == ounce):
-        return 14
-    if(amnt == half_gram):
-        return 15
-
 def as_currency(amount):
     if amount >= 0:
         return '${:,.2f}'.format(amount)
@@ -437,6 +700,7 @@ def cleanhtml(raw_html):
 
 def generate_html( ):
     priorityClass = ""
+    priority = priority_matcher()
     doc, tag, text = Doc().tagtext()
 
     doc.asis('<!DOCTYPE html>')
@@ -533,54 +797,52 @@ def generate_html( ):
                                     
                                     if(len(flower_filters[i].priority_words)):
 
-                                        res = [ele for ele in flower_filters[i].priority_words if(ele.lower() in "".join(row).lower())]
-                                        if (bool(res) is True):
+                                        res = i in priority.match(row.joined_text())
+                                        if (res is True):
                                             priorityClass = "priority"
                                         else:
                                             priorityClass = ""
                                     with tag('tr', klass=priorityClass):
                                         with tag('th', scope='row'):
                                             with tag("small"):
-                                                text(row[0])
+                                                text(row.id)
                                         with tag('td'):
                                             with tag('strong'):
-                                                text(as_currency(float(row[translate_amnt_to_col(flower_filters[i].key)])))
+                                                text(as_currency(row.price(flower_filters[i].key)))
                                         with tag('td', klass="thumb"):
-                                            with tag('a', ('data-fancybox', 'gallery'), href=row[17]):
-                                                doc.stag('img', src=row[17], klass="img img-thumbnail", width="140", onerror="this.src='./img/logo.jpg';")
+                                            with tag('a', ('data-fancybox', 'gallery'), href=row.image):
+                                                doc.stag('img', src=row.image, klass="img img-thumbnail", width="140", onerror="this.src='./img/logo.jpg';")
                                         with tag('td'):
-                                            line = re.sub('[#]', '', row[28])
+                                            line = re.sub('[#]', '', row.path)
                                             url = 'https://weedmaps.com'+line
                                             with tag('a', href=url, target="_blank"):
-                                                text(row[2])
+                                                text(row.name)
                                         with tag('td'):
-                                            text(row[20])
+                                            text(row.category)
                                         with tag('td'):
-                                            if(len(" ".join(row).split("thc"+"+")) > 1):
+                                            if(row.thc is not None):
                                                 colorClass = ""
-                                                amt = " ".join(row).split("thc"+"+")[1].split(' ')[0]
-                                                if float(amt) >= 28:
+                                                if row.thc >= 28:
                                                     colorClass = "text-danger font-weight-bold"
                                                 with tag('span', klass=colorClass):
-                                                    text( as_percentage( float(amt) ) )
+                                                    text( as_percentage( row.thc ) )
                                                 
                                         if(flower_filters[i].cbd_floor > 0):
                                             with tag('td'):
-                                                if(len(" ".join(row).split("cbd"+"+")) > 1):
-                                                    amt = " ".join(row).split("cbd"+"+")[1].split(' ')[0]
-                                                    text( as_percentage( float(amt) ) )
+                                                if(row.cbd is not None):
+                                                    text( as_percentage( row.cbd ) )
                                         if(flower_filters[i].terpenes):
                                             for terp in flower_filters[i].terpenes:
                                                 
                                                 with tag('td'):
-                                                    if(len(" ".join(row).lower().split(terp["name"].lower()+"+")) > 1):
-                                                        amt = " ".join(row).lower().split(terp["name"].lower()+"+")[1].split(' ')[0]
-                                                        text( as_percentage( float(amt) ) )
+                                                    amt = row.terpenes.get(terp["name"].lower())
+                                                    if(amt is not None):
+                                                        text( as_percentage( amt ) )
                                         with tag('td'):
-                                            text(row[29])
+                                            text(row.dispensary)
                                         with tag('td'):
                 
-                                            text(cleanhtml(row[1]))
+                                            text(cleanhtml(row.body))
                     doc.asis('''<!-- Footer -->
                     <footer class="page-footer font-small blue pt-4">
 
@@ -660,6 +922,7 @@ def generate_html( ):
 def generate_html_email( ):
 
     priorityClass = ""
+    priority = priority_matcher()
     doc, tag, text = Doc().tagtext()
 
     doc.asis('<!DOCTYPE html>')
@@ -720,41 +983,41 @@ def generate_html_email( ):
                                     idx += 1
                                     if(len(flower_filters[i].priority_words)):
 
-                                        res = [ele for ele in flower_filters[i].priority_words if(ele.lower() in "".join(row).lower())]
-                                        if (bool(res) is True):
+                                        res = i in priority.match(row.joined_text())
+                                        if (res is True):
                                             priorityClass = "priority"
                                         else:
                                             priorityClass = ""
                                     with tag('tr', klass=priorityClass):
                                         with tag('th'):
                                             with tag('strong'):
-                                                text(as_currency(float(row[translate_amnt_to_col(flower_filters[i].key)])))
+                                                text(as_currency(row.price(flower_filters[i].key)))
                                         with tag('td', klass="thumb"):
-                                            with tag('a', ('data-fancybox', 'gallery'), href=row[17]):
-                                                doc.stag('img', src=row[17], klass="img img-thumbnail", width="140", onerror="this.src='https://github.com/justinemter/CanaData/blob/master/parse-script/output/img/logo.jpg?raw=true';")
+                                            with tag('a', ('data-fancybox', 'gallery'), href=row.image):
+                                                doc.stag('img', src=row.image, klass="img img-thumbnail", width="140", onerror="this.src='https://github.com/justinemter/CanaData/blob/master/parse-script/output/img/logo.jpg?raw=true';")
                                         with tag('td'):
-                                            line = re.sub('[#]', '', row[28])
+                                            line = re.sub('[#]', '', row.path)
                                             url = 'https://weedmaps.com'+line
                                             with tag('a', href=url, target="_blank"):
-                                                text(row[2])
+                                                text(row.name)
                                         with tag('td'):
-                                            text(row[20])
+                                            text(row.category)
                                         with tag('td'):
-                                            if(len(" ".join(row).split("thc"+"+")) > 1):
+                                            if(row.thc is not None):
                                                 colorClass = ""
-                                                amt = " ".join(row).split("thc"+"+")[1].split(' ')[0]
-                                                if float(amt) >= 28:
+                                                if row.thc >= 28:
                                                     colorClass = "text-danger font-weight-bold"
                                                 with tag('span', klass=colorClass):
-                                                    text( as_percentage( float(amt) ) )
+                                                    text( as_percentage( row.thc ) )
                                         with tag('td'):
-                                            text(row[29])
+                                            text(row.dispensary)
 
     return indent(doc.getvalue())
 
 
 def generate_shell_html( ):
     priorityClass = ""
+    priority = priority_matcher()
     doc, tag, text = Doc().tagtext()
 
     doc.asis('<!DOCTYPE html>')
@@ -883,37 +1146,37 @@ def generate_shell_html( ):
                                     
                                     if(len(flower_filters[i].priority_words)):
 
-                                        res = [ele for ele in flower_filters[i].priority_words if(ele.lower() in "".join(row).lower())]
-                                        if (bool(res) is True):
+                                        res = i in priority.match(row.joined_text())
+                                        if (res is True):
                                             priorityClass = "priority"
                                         else:
                                             priorityClass = ""
                                     with tag('tr', klass=priorityClass):
                                         with tag('th', scope='row'):
                                             with tag("small"):
-                                                text(row[0])
+                                                text(row.id)
                                         with tag('td'):
                                             with tag('strong'):
-                                                text(as_currency(float(row[translate_amnt_to_col(flower_filters[i].key)])))
+                                                text(as_currency(row.price(flower_filters[i].key)))
                                         with tag('td', klass="thumb"):
-                                            with tag('a', ('data-fancybox', 'gallery'), href=row[17]):
-                                                doc.stag('img', src=row[17], klass="img img-thumbnail", width="140")
+                                            with tag('a', ('data-fancybox', 'gallery'), href=row.image):
+                                                doc.stag('img', src=row.image, klass="img img-thumbnail", width="140")
                                         with tag('td'):
-                                            line = re.sub('[#]', '', row[28])
+                                            line = re.sub('[#]', '', row.path)
                                             url = 'https://weedmaps.com'+line
                                             with tag('a', href=url, target="_blank"):
-                                                text(row[2])
+                                                text(row.name)
                                         with tag('td'):
-                                            text(row[20])
+                                            text(row.category)
                                         with tag('td'):
                                             try:
-                                                text(as_percentage(float(row[36]))) #THC
+                                                text(as_percentage(float(row.thc_percentage))) #THC
                                             except:
                                                 text("n/a") #THC
                                         with tag('td'):
-                                            text(row[29])
+                                            text(row.dispensary)
                                         with tag('td'):
-                                            text(row[1])
+                                            text(row.body)
     return indent(doc.getvalue()) 
 
 def write_html_to_file(data, filename="index.html"):
@@ -925,9 +1188,40 @@ def write_html_to_file(data, filename="index.html"):
     with open(writepath+fileName, mode, encoding='utf-8') as f:
         f.write(data)
 
-write_html_to_file(generate_html())
-write_html_to_file(generate_shell_html(), "flower-filter-shell.html")
-write_html_to_file(generate_html_email(), "flower-filter-email.html")
-print("Done.")
+if __name__ == '__main__':
+    #-quiet skips the per-row prints, -prom <folder> also writes canaparse.prom there (for node_exporter)
+    quiet = '-quiet' in sys.argv
+    #-nonumpy checks every row in plain Python even with numpy installed
+    use_numpy = '-nonumpy' not in sys.argv
+    prom_folder = sys.argv[sys.argv.index('-prom') + 1] if '-prom' in sys.argv else None
+
+    flower_filters = load_filters()
+    #-slug <slug> reads that slug's results csv instead of csv_file (what email.sh uses)
+    if '-slug' in sys.argv:
+        csv_file = sys.argv[sys.argv.index('-slug') + 1].lower() + "_results.csv"
+    #-go <slug> scrapes the slug with CanaData right here instead of reading back its csv (-workers <number> menus at the same time)
+    if '-go' in sys.argv:
+        slug = sys.argv[sys.argv.index('-go') + 1].lower()
+        workers = sys.argv[sys.argv.index('-workers') + 1] if '-workers' in sys.argv else 1
+        with metrics.phase('scrape'):
+            items = scrape_items(slug, workers, prom_folder)
+        hasWeightArr = load_weighted_items(items)
+    else:
+        hasWeightArr = load_weighted_rows(csv_folder+"/"+csv_file)
+    filtered_tables = filter_rows(flower_filters, hasWeightArr)
+
+    rendered_rows = sum(len(table) for table in filtered_tables)
+    with metrics.phase('render_html', rendered_rows):
+        write_html_to_file(generate_html())
+    with metrics.phase('render_shell'):
+        write_html_to_file(generate_shell_html(), "flower-filter-shell.html")
+    with metrics.phase('render_email', rendered_rows):
+        write_html_to_file(generate_html_email(), "flower-filter-email.html")
+
+    metrics.writeJson("./output/canaparse_metrics.json")
+    if prom_folder is not None:
+        metrics.writePrometheus(prom_folder + "/canaparse.prom")
+    metrics.report()
+    print("Done.")
                 
             
\ No newline at end of file
@@ -31,8 +31,8 @@ email_sender=sender@gmail.com
 #----END EDITABLE VARS-------
 
 cd "$dirpath"
-find . -type d -name "CanaData_*" -exec rm -r "{}" \; #remove any existing CVS downloads
-python3 "$dirpath"/CanaData.py -go "$state"
+find . -maxdepth 1 -type d -name "CanaData_*" -mtime +7 -exec rm -r "{}" \; #remove CSV downloads older than a week (-delta compares against the last one)
+python3 "$dirpath"/CanaData.py -go "$state" -workers 4 -delta -quiet #CSV's, <state>_delta.csv & <state>_metrics.json
 cd "$dirpath"/parse-script/
-python3 "$dirpath"/parse-script/CanaParse.py
+python3 "$dirpath"/parse-script/CanaParse.py -slug "$state" -quiet
 mailx -a 'Content-Type: text/html' -s "daily flowers" "$email_reciever" -- -f "$email_sender" <"$dirpath"/parse-script/output/flower-filter-email.html
\ No newline at end of file